@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import logging
+
+import numpy as np
+
+import datamix as dm
+import matmix as mt
+import modelmix as md
+import utilmix as ut
+
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+if __name__ == '__main__':
+    ut.set_logging()
+    parser = ut.get_cli_parser()
+    parser.add_option("-f", "--file", dest="filename", default=ut.join_paths(ut.get_script_path(), 'data', 'day.csv'),
+                      help="data file")
+    parser.add_option("-i", "--initial", dest="initial", type="int", default=180,
+                      help="days of training data of the first fold")
+    parser.add_option("-t", "--horizon", dest="horizon", type="int", default=30, help="days tested by every fold")
+    parser.add_option("-s", "--step", dest="step", type="int", default=None,
+                      help="days between fold origins, defaults to the horizon")
+    parser.add_option("-r", "--window", dest="window", type="int", default=None,
+                      help="days of a rolling training window, windows expand by default")
+    parser.add_option("-w", "--workers", dest="workers", type="int", default=None,
+                      help="number of processes, defaults to the number of cores")
+    opts = ut.parse_cli_options(parser)
+
+    data = dm.load_bike_data(opts.filename)
+    # the vocabulary and the target range do not depend on the rows used for training
+    encoder = mt.HotEncoder().fit(data, md.get_fields_to_encode(opts.filename))
+    scaler = mt.MinMaxScaler().fit(data, md.fields_to_normalize)
+    x, y = md.design(data, encoder, scaler)
+    splits = md.backtest_date_splits(data.index, opts.initial, opts.horizon, opts.step, opts.window)
+    if not splits:
+        parser.error('no fold fits into {} with {} initial days, use a shorter initial period'.format(
+            opts.filename, opts.initial))
+    logging.info('Backtesting {} folds of {}'.format(len(splits), opts.filename))
+    folds, total = md.backtest(x, y, splits, scale=(scaler.minimums[md.target_field], scaler.ranges[md.target_field]),
+                               workers=opts.workers)
+
+    dates = data.index
+    print('{:<10} {:<10} {:<10} {:>6} {:>8} {:>8} {:>9}'.format('train', 'origin', 'test end', 'alpha', 'RMSE', 'MAE',
+                                                               'MAPE (%)'))
+    for fold in folds:
+        measures = fold['measures']
+        print('{:%Y-%m-%d} {:%Y-%m-%d} {:%Y-%m-%d} {:>6.1f} {:>8.1f} {:>8.1f} {:>9.2f}'.format(
+            dates[fold['train'][0]], dates[fold['test'][0]], dates[fold['test'][1] - 1], fold['alpha'],
+            measures['RMSE'], measures['MAE'], 100*measures['MAPE']))
+    measures = total.result()
+    print('Over all folds (in rides): RMSE {0:.1f}, MAE {1:.1f}, MAPE {2:.2f}%'.format(
+        measures['RMSE'], measures['MAE'], 100*measures['MAPE']))
+    print('Alpha range: {0:.1f} - {1:.1f}'.format(*np.percentile([fold['alpha'] for fold in folds], [0, 100])))
@@ -16,13 +16,11 @@
 """
 import matmix as mt
 import utilmix as ut
+import datamix as dm
 import logging
 
 import pandas as pd
 import numpy as np
-import matplotlib.pylab as plt
-from sklearn import linear_model
-from sklearn.grid_search import GridSearchCV
 
 
 __author__ = "Denys Sobchyshak"
@@ -38,42 +36,61 @@ ut.set_logging()
 parser = ut.get_cli_parser()
 parser.add_option("-f", "--file", dest="filename", default=ut.join_paths(ut.get_script_path(), 'data', 'day.csv'),
                   help="data file with urls")
+parser.add_option("--no-cache", action="store_false", dest="use_cache", default=True,
+                  help="always parse the data file instead of using its columnar cache")
+parser.add_option("--headless", action="store_true", dest="headless", default=False,
+                  help="skip plots, the plotting stack is not imported")
+parser.add_option("-m", "--model", dest="model_path", default=None,
+                  help="store the fitted model bundle for score.py")
+parser.add_option("--lags", action="store_true", dest="lags", default=False,
+                  help="add lagged and rolling ride counts as features of hourly data")
+parser.add_option("--seed", dest="seed", type="int", default=None,
+                  help="seed of the random validation split")
+parser.add_option("--blocked", action="store_true", dest="blocked", default=False,
+                  help="validate on the most recent rows instead of random ones")
 opts = ut.parse_cli_options(parser)
 data_path = opts.filename
 is_hour_data = 'hour' in data_path
 
 # loading data
-data = pd.read_csv(data_path, parse_dates=[1], index_col=1, date_parser=lambda x: pd.datetime.strptime(x, "%Y-%m-%d"))
+data = dm.load_bike_data(data_path, use_cache=opts.use_cache)
 
 logging.info('Cleaning and normalizing the feature space')
 # we have no need in an index feature
 features = data.drop(['instant'], axis=1)
+if is_hour_data and opts.lags:
+    # lagged and rolling ride counts from preceding hours, the first hours lack a full history
+    lag_features = mt.LagFeatures()
+    features[lag_features.feature_names] = lag_features.update(features['cnt'].values)
+    features = features.iloc[lag_features.memory:]
 fields_to_encode = ['season', 'yr', 'mnth', 'weekday', 'weathersit']
 if is_hour_data:
     fields_to_encode.append('hr')
-mt.hot_encode(features, fields_to_encode)
+encoder = mt.hot_encode(features, fields_to_encode)
 fields_to_normalize = ['casual', 'registered', 'cnt']
-for field in fields_to_normalize:
-    features[field] = mt.normalize(features[field])
+scaler = mt.MinMaxScaler().fit(features, fields_to_normalize)
+scaler.transform(features, inplace=True)
 
 logging.info('Checking covariances and correlations')
 labels = ['temp', 'atemp', 'hum', 'windspeed', 'casual', 'registered', 'cnt']
 # labels = ['atemp', 'casual', 'registered', 'cnt']
 cov_df = features.loc[:, labels]
-# check revenue shape
-plt.plot(cov_df.cnt)
-plt.title('Normalized revenue shape')
-plt.show()
 # check covariances
 print('Covariance matrix: \n{}'.format(cov_df.cov()))
 print('Correlation matrix: \n{}'.format(cov_df.corr()))
-n = len(labels)
-f, splt = plt.subplots(n, n)
-for i in range(0, n):
-    for j in range(0, n):
-        splt[i, j].scatter(cov_df[labels[i]], cov_df[labels[j]])
-        splt[i, j].set_title('{0} vs {1}'.format(labels[i], labels[j]), fontsize=10)
-plt.show()
+if not opts.headless:
+    import matplotlib.pylab as plt
+    # check revenue shape
+    plt.plot(cov_df.cnt)
+    plt.title('Normalized revenue shape')
+    plt.show()
+    n = len(labels)
+    f, splt = plt.subplots(n, n)
+    for i in range(0, n):
+        for j in range(0, n):
+            splt[i, j].scatter(cov_df[labels[i]], cov_df[labels[j]])
+            splt[i, j].set_title('{0} vs {1}'.format(labels[i], labels[j]), fontsize=10)
+    plt.show()
 
 logging.info('Removing insignificant features')
 # casual and registered users info is what we need to predict and we're not building separate models for them
@@ -82,44 +99,51 @@ features = features.drop(['casual', 'registered'], axis=1)
 features = features.drop(['temp', 'hum', 'windspeed'], axis=1)
 
 logging.info('Removing {0:.2f}% of outliers'.format(outlier_share*100))
-x_train = features.drop(['cnt'], axis=1)
-y_train = features['cnt']
-clf = linear_model.RidgeCV(alphas=np.arange(0, 10, .2), cv=10)
-y_predict = pd.Series(clf.fit(x_train, y_train).predict(x_train), index=x_train.index)
-errors = (y_train - y_predict).abs()
-eps = errors.nlargest(round(outlier_share * features.shape[0])).min()
-features = features[errors < eps]
+x_all = features.drop(['cnt'], axis=1)
+y_all = features['cnt']
+clf = mt.RidgeCV(alphas=np.arange(0, 10, .2), cv=10)
+errors = np.abs(y_all.values - clf.fit(x_all, y_all).predict(x_all))
+keep = mt.trim_mask(errors, outlier_share)
 
 logging.info('Partitioning the data')
-n_validation = round(validation_share*data.shape[0])
-idx = set(np.random.randint(0, features.shape[0], size=n_validation))
-while len(idx) != n_validation:
-    idx.add(np.random.randint(0, features.shape[0]))
-idx = list(idx)
-validation = features.loc[features.index[idx]]
-features.drop(features.index[idx], inplace=True)
+is_validation = mt.split_mask(keep, round(validation_share*data.shape[0]), seed=opts.seed, blocked=opts.blocked)
+is_train = keep & ~is_validation
 
 logging.info('Fitting a model')
-x_train = features.drop(['cnt'], axis=1)
-y_train = features['cnt']
-clf.set_params(cv=5)
-y_predict = pd.Series(clf.fit(x_train, y_train).predict(x_train), index=x_train.index)
-print('Model parameters: {}'.format(clf.best_params_ if isinstance(clf, GridSearchCV) else {'alpha': clf.alpha_}))
-if not is_hour_data:
-    mt.show_prediction(y_train, y_predict)
+# the fold statistics of the outlier pass are reused, only dropped rows are read
+clf.fit_subset(x_all, y_all, is_train)
+print('Model parameters: {}'.format({'alpha': clf.alpha_}))
+if not is_hour_data and not opts.headless:
+    y_train = y_all[is_train]
+    mt.show_prediction(y_train, pd.Series(clf.predict(x_all[is_train]), index=y_train.index))
 
 logging.info('Validating results on {0:.2f}% of unused data'.format(validation_share*100))
-x_valid = validation.drop(['cnt'], axis=1)
-y_valid = validation['cnt']
+x_valid = x_all[is_validation]
+y_valid = y_all[is_validation]
 y_predict = pd.Series(clf.predict(x_valid), index=x_valid.index)
+error_measures = mt.error_measures(y_valid.values, y_predict.values)
 error_measures = {
-    'RMSE': mt.rmse(y_valid, y_predict),
-    'MAE':  mt.mae(y_valid, y_predict),
-    'MPE (in %)':  100*mt.mpe(y_valid, y_predict),
-    'MAPE (in %)': 100*mt.mape(y_valid, y_predict)
+    'RMSE': error_measures['RMSE'],
+    'MAE':  error_measures['MAE'],
+    'MPE (in %)':  100*error_measures['MPE'],
+    'MAPE (in %)': 100*error_measures['MAPE']
 }
 for key, val in error_measures.items():
     if not np.isnan(val) and not np.isinf(val):
         print('{0}: {1:.4f}'.format(key, val))
 
-# TODO:scale back the values for production reuse
+logging.info('Scaling predictions back to ride counts')
+rides_valid = scaler.inverse_transform(y_valid.values, 'cnt')
+rides_predict = scaler.inverse_transform(y_predict.values, 'cnt')
+error_measures = mt.error_measures(rides_valid, rides_predict)
+print('RMSE (in rides): {0:.1f}'.format(error_measures['RMSE']))
+print('MAE (in rides): {0:.1f}'.format(error_measures['MAE']))
+for month, measures in mt.error_measures(rides_valid, rides_predict, y_valid.index.month).items():
+    print('Month {0}: RMSE {1:.1f}, MAE {2:.1f} (in rides)'.format(month, measures['RMSE'], measures['MAE']))
+
+if opts.model_path:
+    logging.info('Storing the model in {}'.format(opts.model_path))
+    # the history of lag features ends with the last hour of the data, so the model scores the hours that follow
+    model = mt.RidgeModel.from_estimator(clf, x_all.columns, encoder, scaler,
+                                         lag_features=lag_features if is_hour_data and opts.lags else None)
+    model.save(opts.model_path)
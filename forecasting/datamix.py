@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import utilmix as ut
+
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+# bike sharing dataset columns and their compact types
+categorical_fields = ['season', 'weathersit', 'hr']
+small_int_fields = {'yr': np.int8, 'mnth': np.int8, 'holiday': np.int8, 'weekday': np.int8, 'workingday': np.int8}
+measure_fields = ['temp', 'atemp', 'hum', 'windspeed']
+count_fields = {'instant': np.int32, 'casual': np.int32, 'registered': np.int32, 'cnt': np.int32}
+date_field = 'dteday'
+date_format = '%Y-%m-%d'
+cache_version = 1
+
+
+def get_bike_dtypes(path):
+    """
+    Compact types of columns present in a bike sharing CSV.
+    :param path:
+    :return:
+    """
+    # categorical fields are read as integers first, so that categories stay numeric
+    dtypes = {field: np.int8 for field in categorical_fields}
+    dtypes.update(small_int_fields)
+    dtypes.update({field: np.float32 for field in measure_fields})
+    dtypes.update(count_fields)
+    header = pd.read_csv(path, nrows=0).columns
+    return {k: v for k, v in dtypes.items() if k in header}
+
+
+def read_bike_csv(path):
+    """
+    Parses a bike sharing CSV with vectorized date handling and downcast types.
+    :param path:
+    :return: data frame indexed by date
+    """
+    data = pd.read_csv(path, dtype=get_bike_dtypes(path))
+    data[date_field] = pd.to_datetime(data[date_field], format=date_format)
+    for field in categorical_fields:
+        if field in data:
+            data[field] = data[field].astype('category')
+    return data.set_index(date_field)
+
+
+def read_bike_chunks(path, chunk_size=100000):
+    """
+    Parses a bike sharing CSV chunk by chunk with the same types as read_bike_csv, except that categorical fields stay
+    integers, since categories of a single chunk are incomplete.
+    :param path:
+    :param chunk_size: number of rows per chunk
+    :return: generator of data frames indexed by date
+    """
+    for chunk in pd.read_csv(path, dtype=get_bike_dtypes(path), chunksize=chunk_size):
+        chunk[date_field] = pd.to_datetime(chunk[date_field], format=date_format)
+        yield chunk.set_index(date_field)
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Computes SHA-1 of a file reading it in blocks.
+    :param path:
+    :param block_size:
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_cache_dir(path):
+    """
+    Default cache location of a CSV: a directory next to it named after the file.
+    :param path:
+    :return:
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, '.cache', name)
+
+
+def is_cache_valid(path, cache_dir):
+    """
+    Checks that a cache was built from the current version of a source file. Matching size and modification time are
+    trusted, otherwise the content hash decides and a matching cache gets its modification time refreshed.
+    :param path: source file
+    :param cache_dir:
+    :return: True if cache can be used
+    """
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    stat = os.stat(path)
+    if meta.get('version') != cache_version or meta['source']['size'] != stat.st_size:
+        return False
+    if meta['source']['mtime'] == stat.st_mtime:
+        return True
+    if meta['source']['sha1'] != file_hash(path):
+        return False
+    meta['source']['mtime'] = stat.st_mtime
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return True
+
+
+def save_cache(data, path, cache_dir):
+    """
+    Stores a data frame column by column as .npy files. Categorical columns are stored as codes with their categories.
+    Metadata is written last, so that an interrupted write leaves no valid cache behind.
+    :param data:
+    :param path: source file
+    :param cache_dir:
+    :return:
+    """
+    ut.make_path(cache_dir)
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    columns = list()
+    for i, label in enumerate(data.columns):
+        column = data[label]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(cache_dir, '{}.codes.npy'.format(i)), column.cat.codes.values)
+            np.save(os.path.join(cache_dir, '{}.categories.npy'.format(i)), column.cat.categories.values)
+            columns.append({'name': label, 'kind': 'categorical'})
+        else:
+            np.save(os.path.join(cache_dir, '{}.npy'.format(i)), column.values)
+            columns.append({'name': label, 'kind': 'plain'})
+    np.save(os.path.join(cache_dir, 'index.npy'), data.index.values)
+    stat = os.stat(path)
+    meta = {
+        'version': cache_version,
+        'source': {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime,
+                   'sha1': file_hash(path)},
+        'index': data.index.name,
+        'columns': columns
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+
+def load_cache(cache_dir):
+    """
+    Loads a data frame stored with save_cache, plain columns stay memory-mapped.
+    :param cache_dir:
+    :return:
+    """
+    with open(os.path.join(cache_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    columns = dict()
+    for i, column in enumerate(meta['columns']):
+        if column['kind'] == 'categorical':
+            codes = np.load(os.path.join(cache_dir, '{}.codes.npy'.format(i)))
+            categories = np.load(os.path.join(cache_dir, '{}.categories.npy'.format(i)))
+            columns[column['name']] = pd.Categorical.from_codes(codes, categories)
+        else:
+            columns[column['name']] = np.load(os.path.join(cache_dir, '{}.npy'.format(i)), mmap_mode='r')
+    index = pd.Index(np.load(os.path.join(cache_dir, 'index.npy'), mmap_mode='r'), name=meta['index'])
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def load_bike_data(path, cache_dir=None, use_cache=True):
+    """
+    Loads a bike sharing CSV through a columnar cache, which is rebuilt whenever the source changes.
+    :param path:
+    :param cache_dir: defaults to get_cache_dir(path)
+    :param use_cache: set to False to always parse the CSV
+    :return: data frame indexed by date
+    """
+    if not use_cache:
+        return read_bike_csv(path)
+    cache_dir = cache_dir or get_cache_dir(path)
+    if is_cache_valid(path, cache_dir):
+        logging.info('Loading cached {}'.format(path))
+        return load_cache(cache_dir)
+    logging.info('Parsing {} and caching it in {}'.format(path, cache_dir))
+    data = read_bike_csv(path)
+    save_cache(data, path, cache_dir)
+    return data
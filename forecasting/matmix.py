@@ -14,9 +14,11 @@
     See the License for the specific language governing permissions and
     limitations under the License.
 """
+import functools
+import json
 import math
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
 
 __author__ = "Denys Sobchyshak"
@@ -78,19 +80,328 @@ def mpe(actual, forecast):
         return ((actual - forecast) / actual).sum() / actual.shape[0]
 
 
-def hot_encode(features, labels):
+class ErrorMetrics:
     """
-    Use inplace one-hot-encoding for categorical or insusceptible to distance features.
+    Accumulates all error measures of a forecast at once. Residuals are computed once per update and only their sums
+    are kept, so that validation sets can be evaluated chunk by chunk and evaluated per group (e.g. per season).
+    """
+    names = ('RMSE', 'MSE', 'MAE', 'MPE', 'MAPE')
+
+    def __init__(self):
+        # group -> count, sum of squared, absolute, relative and absolute relative errors
+        self.sums = dict()
+
+    def update(self, actual, forecast, groups=None):
+        """
+        Adds a chunk of observations.
+        :param actual:
+        :param forecast:
+        :param groups: group label of every observation, all observations form a single group None if not provided
+        :return: self
+        """
+        actual = np.asarray(actual, dtype=float)
+        residuals = actual - np.asarray(forecast, dtype=float)
+        # zero actual values make relative measures infinite or undefined, as in mape and mpe
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative = residuals / actual
+            terms = (residuals * residuals, np.abs(residuals), relative, np.abs(relative))
+            if groups is None:
+                sums = {None: np.array([len(residuals)] + [term.sum() for term in terms])}
+            else:
+                keys, inverse = np.unique(np.asarray(groups), return_inverse=True)
+                inverse = inverse.ravel()
+                sums = np.column_stack([np.bincount(inverse, minlength=len(keys))] +
+                                       [np.bincount(inverse, term, len(keys)) for term in terms])
+                sums = dict(zip(keys.tolist(), sums))
+        for key, value in sums.items():
+            self.sums[key] = self.sums[key] + value if key in self.sums else value
+        return self
+
+    def merge(self, other):
+        """
+        Adds sums accumulated by another instance, e.g. computed on another chunk in parallel.
+        :param other:
+        :return: self
+        """
+        for key, value in other.sums.items():
+            self.sums[key] = self.sums[key] + value if key in self.sums else value.copy()
+        return self
+
+    @classmethod
+    def measures(cls, sums):
+        count, squared, absolute, relative, absolute_relative = sums
+        if not count:
+            return dict.fromkeys(cls.names, np.nan)
+        return dict(zip(cls.names, (math.sqrt(squared / count), float(squared / count), float(absolute / count),
+                                    float(relative / count), float(absolute_relative / count))))
+
+    def results(self):
+        """
+        Error measures of every group.
+        :return: mapping of group to mapping of measure name to its value
+        """
+        try:
+            keys = sorted(self.sums)
+        except TypeError:
+            keys = list(self.sums)
+        return {key: self.measures(self.sums[key]) for key in keys}
+
+    def result(self):
+        """
+        Error measures over all observations.
+        :return: mapping of measure name to its value
+        """
+        return self.measures(sum(self.sums.values()) if self.sums else np.zeros(5))
+
+
+def error_measures(actual, forecast, groups=None):
+    """
+    Calculates RMSE, MSE, MAE, MPE and MAPE in one call.
+    :param actual:
+    :param forecast:
+    :param groups: group label of every observation to evaluate every group separately
+    :return: mapping of measure name to its value, or mapping of group to such mappings if groups are provided
+    """
+    metrics = ErrorMetrics().update(actual, forecast, groups)
+    return metrics.result() if groups is None else metrics.results()
+
+
+class HotEncoder:
+    """
+    One-hot encoder with a vocabulary learnt once. Transforms all labels in a single pass into a sparse CSR or dense
+    uint8 matrix, categories unseen during fitting are encoded as all zeros. A fitted encoder can be stored with
+    to_dict and restored with from_dict to score new data without refitting.
+    """
+    def __init__(self, vocabulary=None):
+        """
+        :param vocabulary: ordered mapping of label to its categories
+        """
+        self.vocabulary = vocabulary or dict()
+
+    def fit(self, features, labels):
+        """
+        Learns sorted categories of provided labels.
+        :param features:
+        :param labels:
+        :return: self
+        """
+        self.vocabulary = {label: np.unique(np.asarray(features[label])) for label in labels}
+        return self
+
+    def partial_fit(self, features, labels):
+        """
+        Extends categories of provided labels with the ones present in features, e.g. while reading data in chunks.
+        :param features:
+        :param labels:
+        :return: self
+        """
+        for label in labels:
+            categories = np.unique(np.asarray(features[label]))
+            if label in self.vocabulary:
+                categories = np.union1d(self.vocabulary[label], categories)
+            self.vocabulary[label] = categories
+        return self
+
+    @property
+    def labels(self):
+        return list(self.vocabulary.keys())
+
+    @property
+    def feature_names(self):
+        """
+        Names of encoded columns, same as produced by pd.get_dummies with label prefixes.
+        :return:
+        """
+        return ['{}_{}'.format(label, category) for label, categories in self.vocabulary.items()
+                for category in categories]
+
+    def codes(self, features):
+        """
+        Column index of every value of every label in the encoded matrix, -1 for unknown categories.
+        :param features: data frame or mapping of label to values
+        :return: array of shape (rows x labels)
+        """
+        columns = [np.asarray(features[label]) for label in self.vocabulary]
+        codes = np.empty((len(columns[0]) if columns else len(features), len(columns)), dtype=np.int64)
+        offset = 0
+        for i, (values, categories) in enumerate(zip(columns, self.vocabulary.values())):
+            positions = np.searchsorted(categories, values).clip(0, max(len(categories) - 1, 0))
+            known = categories[positions] == values if len(categories) else np.zeros(len(values), dtype=bool)
+            codes[:, i] = np.where(known, positions + offset, -1)
+            offset += len(categories)
+        return codes
+
+    def transform(self, features, sparse=True):
+        """
+        Encodes provided labels of features.
+        :param features:
+        :param sparse: return scipy.sparse CSR matrix if True, dense uint8 array otherwise
+        :return:
+        """
+        codes = self.codes(features)
+        n, width = codes.shape[0], len(self.feature_names)
+        if sparse:
+            import scipy.sparse as sp
+            known = codes >= 0
+            indptr = np.concatenate(([0], np.cumsum(known.sum(axis=1))))
+            return sp.csr_matrix((np.ones(indptr[-1], dtype=np.uint8), codes[known], indptr), shape=(n, width))
+        encoded = np.zeros((n, width), dtype=np.uint8)
+        rows, fields = np.nonzero(codes >= 0)
+        encoded[rows, codes[rows, fields]] = 1
+        return encoded
+
+    def fit_transform(self, features, labels, sparse=True):
+        return self.fit(features, labels).transform(features, sparse)
+
+    def to_dict(self):
+        return {label: categories.tolist() for label, categories in self.vocabulary.items()}
+
+    @classmethod
+    def from_dict(cls, vocabulary):
+        return cls({label: np.asarray(categories) for label, categories in vocabulary.items()})
+
+
+def hot_encode(features, labels, encoder=None):
+    """
+    Use inplace one-hot-encoding for categorical or insusceptible to distance features. All encoded columns are added
+    to the frame at once as uint8.
     :param features:
     :param labels:
-    :return:
+    :param encoder: fitted HotEncoder to reuse, a new one is fitted if not provided
+    :return: the encoder
     """
-    for label in labels:
-        encoding = pd.get_dummies(features[label], prefix=label)
-        # default DataFrame.join feature seems to have memory problems, doing the addition manually
-        for column_label in encoding.columns.values:
-            features[column_label] = encoding[column_label]
+    encoder = encoder or HotEncoder().fit(features, labels)
+    encoding = pd.DataFrame(encoder.transform(features, sparse=False), index=features.index,
+                            columns=encoder.feature_names)
     features.drop(labels, axis=1, inplace=True)
+    features[encoding.columns] = encoding
+    return encoder
+
+
+class LagFeatures:
+    """
+    Lagged values and rolling mean, standard deviation and maximum of a series, e.g. hourly ride counts. Every row only
+    sees values before it. Rolling sums come from cumulative sums and maximums from a strided view of the windows. The
+    last values are kept as history, so that rows arriving later get their features without recomputing the past.
+    Lags and windows are counted in rows. Unknown values (NaN) still take their row, features reaching back into them
+    are NaN.
+    """
+    def __init__(self, lags=(1, 2, 24, 168), windows=(24, 168), name='cnt', history=None):
+        """
+        :param lags: lags of the series
+        :param windows: lengths of rolling windows, at least 2 rows
+        :param name: prefix of feature names
+        :param history: last values of the series seen so far
+        """
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.name = name
+        self.history = np.asarray(history if history is not None else [], dtype=float)
+
+    @property
+    def feature_names(self):
+        return (['{}_lag_{}'.format(self.name, lag) for lag in self.lags] +
+                ['{}_{}_{}'.format(self.name, kind, window) for window in self.windows for kind in ('mean', 'std', 'max')])
+
+    @property
+    def memory(self):
+        """
+        Number of past values needed to compute features of a new row.
+        :return:
+        """
+        return max(self.lags + self.windows + [0])
+
+    def transform(self, values, history=None):
+        """
+        Computes features of every value.
+        :param values:
+        :param history: values preceding the first one, features are NaN where the past is too short
+        :return: array of shape (values x features)
+        """
+        history = np.empty(0) if history is None else np.asarray(history, dtype=float)
+        series = np.concatenate((history, np.asarray(values, dtype=float)))
+        positions = np.arange(len(history), len(series))
+        features = np.full((len(positions), len(self.feature_names)), np.nan)
+        for i, lag in enumerate(self.lags):
+            valid = positions >= lag
+            features[valid, i] = series[positions[valid] - lag]
+        # unknown values are counted instead of summed, so that they only spoil windows that cover them
+        missing = np.isnan(series)
+        filled = np.where(missing, 0, series)
+        sums = np.concatenate(([0], np.cumsum(filled)))
+        squares = np.concatenate(([0], np.cumsum(filled**2)))
+        gaps = np.concatenate(([0], np.cumsum(missing)))
+        column = len(self.lags)
+        for window in self.windows:
+            valid = positions >= window
+            ends = positions[valid]
+            if len(ends):
+                mean = (sums[ends] - sums[ends - window]) / window
+                variance = (squares[ends] - squares[ends - window] - window * mean**2) / (window - 1)
+                incomplete = gaps[ends] > gaps[ends - window]
+                mean[incomplete], variance[incomplete] = np.nan, np.nan
+                windows = np.lib.stride_tricks.sliding_window_view(series[ends[0] - window:ends[-1]], window)
+                features[valid, column] = mean
+                features[valid, column + 1] = np.sqrt(variance.clip(0))
+                features[valid, column + 2] = windows.max(axis=1)
+            column += 3
+        return features
+
+    def update(self, values):
+        """
+        Computes features of new values that follow the history and appends them to it, e.g. ride counts of past hours
+        along with hours still to be forecast.
+        :param values: NaN for values not known yet, e.g. hours to forecast
+        :return: array of shape (values x features)
+        """
+        features = self.transform(values, self.history)
+        history = np.concatenate((self.history, np.asarray(values, dtype=float)))
+        self.history = history[max(len(history) - self.memory, 0):]
+        return features
+
+    def to_dict(self):
+        history = [None if np.isnan(value) else value for value in self.history.tolist()]
+        return {'lags': self.lags, 'windows': self.windows, 'name': self.name, 'history': history}
+
+    @classmethod
+    def from_dict(cls, parameters):
+        return cls(parameters['lags'], parameters['windows'], parameters['name'], parameters['history'])
+
+
+def trim_mask(errors, share):
+    """
+    Marks rows to keep after removing a share of rows with the largest errors. The threshold is found with a partial
+    sort and rows with errors equal to it are removed as well.
+    :param errors: absolute errors
+    :param share: share of rows to remove
+    :return: boolean mask of rows to keep
+    """
+    errors = np.asarray(errors)
+    n = len(errors)
+    k = int(round(share * n))
+    if not k:
+        return np.ones(n, dtype=bool)
+    return errors < np.partition(errors, n - k)[n - k]
+
+
+def split_mask(rows, size, seed=None, blocked=False):
+    """
+    Picks validation rows with a single seeded permutation, or as the last rows for time-ordered data.
+    :param rows: number of rows or boolean mask of rows eligible for validation
+    :param size: number of validation rows
+    :param seed:
+    :param blocked: take the last eligible rows instead of random ones, so that validation follows training in time
+    :return: boolean mask of validation rows
+    """
+    rows = np.ones(rows, dtype=bool) if np.isscalar(rows) else np.asarray(rows, dtype=bool)
+    eligible = np.flatnonzero(rows)
+    if blocked:
+        chosen = eligible[max(len(eligible) - size, 0):]
+    else:
+        chosen = eligible[np.random.RandomState(seed).permutation(len(eligible))[:size]]
+    mask = np.zeros(len(rows), dtype=bool)
+    mask[chosen] = True
+    return mask
 
 
 def normalize(features):
@@ -102,6 +413,376 @@ def normalize(features):
     return (features - features.min()) / (features.max() - features.min())
 
 
+class MinMaxScaler:
+    """
+    Scales columns into [0,1] range with per-column parameters learnt once, so that the same scaling can be applied to
+    new data and predictions can be mapped back. Parameters can be stored with to_dict and restored with from_dict.
+    """
+    def __init__(self, minimums=None, ranges=None):
+        """
+        :param minimums: mapping of column to its minimum
+        :param ranges: mapping of column to its max - min
+        """
+        self.minimums = pd.Series(minimums, dtype=float)
+        self.ranges = pd.Series(ranges, dtype=float)
+        # running extremes of partial fits
+        self.extremes = None
+
+    def fit(self, features, columns):
+        """
+        Learns minimums and ranges of provided columns.
+        :param features:
+        :param columns:
+        :return: self
+        """
+        self.extremes = None
+        return self.partial_fit(features, columns)
+
+    def partial_fit(self, features, columns):
+        """
+        Extends minimums and ranges of provided columns with values present in features, e.g. while reading data in
+        chunks.
+        :param features:
+        :param columns:
+        :return: self
+        """
+        values = features[columns].to_numpy(dtype=float)
+        minimums, maximums = values.min(axis=0), values.max(axis=0)
+        if self.extremes is not None:
+            minimums, maximums = np.minimum(minimums, self.extremes[0]), np.maximum(maximums, self.extremes[1])
+        self.extremes = minimums, maximums
+        ranges = maximums - minimums
+        # constant columns are only shifted
+        ranges[ranges == 0] = 1
+        self.minimums = pd.Series(minimums, index=columns)
+        self.ranges = pd.Series(ranges, index=columns)
+        return self
+
+    @property
+    def columns(self):
+        return list(self.minimums.index)
+
+    def _parameters(self, columns):
+        return self.minimums[columns].to_numpy(), self.ranges[columns].to_numpy()
+
+    def transform(self, features, inplace=False):
+        """
+        Scales all fitted columns of a data frame in one vectorized operation, other columns are left untouched.
+        :param features:
+        :param inplace: replace columns of provided frame instead of returning a new frame, which shares unscaled
+            columns with the provided one
+        :return: scaled frame
+        """
+        minimums, ranges = self._parameters(self.columns)
+        scaled = (features[self.columns].to_numpy(dtype=float) - minimums) / ranges
+        if not inplace:
+            features = features.copy(deep=False)
+        # assigning whole columns replaces them, so a shallow copy never writes into the provided frame
+        for column, values in zip(self.columns, scaled.T):
+            features[column] = values
+        return features
+
+    def inverse_transform(self, values, column=None):
+        """
+        Maps scaled values back to original units.
+        :param values: data frame with fitted columns, series named after a fitted column or an array
+        :param column: column of a series or a 1-D array, defaults to the series name
+        :return: values of the same type in original units
+        """
+        if isinstance(values, pd.DataFrame):
+            minimums, ranges = self._parameters(self.columns)
+            restored = values.copy()
+            restored[self.columns] = values[self.columns].to_numpy(dtype=float) * ranges + minimums
+            return restored
+        column = column or getattr(values, 'name', None)
+        return values * self.ranges[column] + self.minimums[column]
+
+    def to_dict(self):
+        return {'minimums': self.minimums.to_dict(), 'ranges': self.ranges.to_dict()}
+
+    @classmethod
+    def from_dict(cls, parameters):
+        return cls(parameters['minimums'], parameters['ranges'])
+
+
+def ridge_statistics(x, y):
+    """
+    Sufficient statistics of a least squares problem. They are additive over rows, so statistics of any union or
+    difference of row sets are obtained without touching the rows again.
+    :param x: design matrix
+    :param y: target
+    :return: count, column sums, target sum, gram matrix, x'y and sum of squared targets
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    return np.array([len(y)]), x.sum(axis=0), np.array([y.sum()]), x.T.dot(x), x.T.dot(y), np.array([y.dot(y)])
+
+
+def ridge_path(statistics, alphas):
+    """
+    Solves ridge regression with intercept for all alphas from a single eigendecomposition of the centered gram matrix.
+    Directions with zero variance are left out, which gives the least norm solution for alpha 0.
+    :param statistics: as returned by ridge_statistics
+    :param alphas:
+    :return: coefficients (features x alphas) and intercepts (alphas)
+    """
+    count, sums, total, gram, moment, _ = statistics
+    count = count[0]
+    mean, target_mean = sums / count, total[0] / count
+    eigenvalues, eigenvectors = np.linalg.eigh(gram - count * np.outer(mean, mean))
+    eigenvalues = eigenvalues.clip(0)
+    projection = eigenvectors.T.dot(moment - count * mean * target_mean)
+    denominators = eigenvalues[:, np.newaxis] + np.asarray(alphas, dtype=float)[np.newaxis, :]
+    tolerance = eigenvalues.max() * len(eigenvalues) * np.finfo(float).eps
+    scale = np.divide(1, denominators, out=np.zeros_like(denominators), where=denominators > tolerance)
+    coefficients = eigenvectors.dot(projection[:, np.newaxis] * scale)
+    return coefficients, target_mean - mean.dot(coefficients)
+
+
+def ridge_errors(statistics, coefficients, intercepts):
+    """
+    Sums of squared errors of several solutions on the rows summarized by statistics.
+    :param statistics: as returned by ridge_statistics
+    :param coefficients: features x solutions
+    :param intercepts:
+    :return: array of sums of squared errors
+    """
+    count, sums, total, gram, moment, squares = statistics
+    return (squares[0] - 2 * (moment.dot(coefficients) + intercepts * total[0]) +
+            np.einsum('ia,ij,ja->a', coefficients, gram, coefficients) +
+            2 * intercepts * sums.dot(coefficients) + count[0] * intercepts**2)
+
+
+def fold_bounds(n, cv):
+    """
+    Boundaries of contiguous folds, the first n % cv folds are one row longer as in sklearn.model_selection.KFold.
+    :param n: number of rows
+    :param cv: number of folds
+    :return: first row of every fold followed by n
+    """
+    sizes = np.full(cv, n // cv)
+    sizes[:n % cv] += 1
+    return np.concatenate(([0], np.cumsum(sizes)))
+
+
+def add_statistics(first, second):
+    """
+    Statistics of the union of two disjoint row sets, None stands for an empty set.
+    :param first:
+    :param second:
+    :return:
+    """
+    if first is None:
+        return second
+    return tuple(a + b for a, b in zip(first, second))
+
+
+class RidgeCV:
+    """
+    Ridge regression with the regularization chosen by k-fold cross-validation. Every fold is summarized once by its
+    sufficient statistics, training statistics of a fold are the totals minus the fold, and the whole alpha grid is
+    scored from one eigendecomposition per fold. Folds are processed by a thread pool.
+    """
+    def __init__(self, alphas=(0.1, 1.0, 10.0), cv=5, workers=None, scoring='r2'):
+        """
+        :param alphas: regularization grid
+        :param cv: number of contiguous folds
+        :param workers: number of threads, defaults to the number of processors
+        :param scoring: r2 picks the alpha with the best mean R^2 of folds as sklearn RidgeCV does, mse the one with the
+            smallest squared error pooled over folds
+        """
+        self.alphas = np.asarray(alphas, dtype=float)
+        self.cv = cv
+        self.scoring = scoring
+        self.workers = workers
+        self.bounds = None
+        self.fold_statistics = None
+
+    def _map(self, function, items):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(self.workers) as pool:
+            return list(pool.map(function, items))
+
+    def fit(self, x, y):
+        """
+        :param x: design matrix
+        :param y: target
+        :return: self
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        bounds = fold_bounds(len(y), self.cv)
+        return self.fit_statistics(self._map(lambda fold: ridge_statistics(x[fold[0]:fold[1]], y[fold[0]:fold[1]]),
+                                             zip(bounds[:-1], bounds[1:])), bounds)
+
+    def fit_statistics(self, fold_statistics, bounds):
+        """
+        Fits from statistics of folds accumulated elsewhere, e.g. while reading data in chunks.
+        :param fold_statistics: list of ridge_statistics of every fold
+        :param bounds: first row of every fold followed by the number of rows
+        :return: self
+        """
+        self.fold_statistics, self.bounds = list(fold_statistics), bounds
+        return self._select()
+
+    def fit_subset(self, x, y, keep):
+        """
+        Refits on a subset of rows of the last fit, e.g. after outliers were removed. Only dropped rows are read, their
+        statistics are subtracted from the folds they belonged to.
+        :param x: design matrix of the last fit
+        :param y: target of the last fit
+        :param keep: boolean mask of rows to keep
+        :return: self
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        dropped = np.flatnonzero(~np.asarray(keep))
+        folds = np.searchsorted(self.bounds, dropped, side='right') - 1
+        for fold in np.unique(folds):
+            rows = dropped[folds == fold]
+            removed = ridge_statistics(x[rows], y[rows])
+            self.fold_statistics[fold] = tuple(a - b for a, b in zip(self.fold_statistics[fold], removed))
+        return self._select()
+
+    def _select(self):
+        totals = functools.reduce(add_statistics, self.fold_statistics)
+
+        def fold_errors(statistics):
+            training = tuple(a - b for a, b in zip(totals, statistics))
+            return ridge_errors(statistics, *ridge_path(training, self.alphas))
+
+        errors = np.array(self._map(fold_errors, self.fold_statistics))
+        self.cv_errors_ = errors.sum(axis=0) / totals[0][0]
+        # R^2 of a fold compares errors with the variance of the fold around its own mean
+        count, _, total, _, _, squares = (np.array([statistics[i][0] for statistics in self.fold_statistics])
+                                          for i in range(6))
+        self.cv_r2_ = (1 - errors / (squares - total**2 / count)[:, np.newaxis]).mean(axis=0)
+        best = int(np.argmax(self.cv_r2_) if self.scoring == 'r2' else np.argmin(self.cv_errors_))
+        # higher is better, as in sklearn
+        self.best_score_ = float(self.cv_r2_[best] if self.scoring == 'r2' else -self.cv_errors_[best])
+        self.alpha_ = float(self.alphas[best])
+        coefficients, intercepts = ridge_path(totals, [self.alpha_])
+        self.coef_, self.intercept_ = coefficients[:, 0], intercepts[0]
+        return self
+
+    def predict(self, x):
+        return np.asarray(x, dtype=float).dot(self.coef_) + self.intercept_
+
+
+class RidgeModel:
+    """
+    Fitted linear forecaster bundled with its encoder and scaler, so that raw rows can be scored without sklearn or
+    pandas. One-hot encoded columns are never materialized: their contribution is a lookup of coefficients by category
+    code, the remaining columns are a single dot product, and the result is scaled back to the target units. A model
+    fitted with LagFeatures keeps their history and computes them for scored rows.
+    """
+    def __init__(self, columns, coefficients, intercept, encoder, scaler, target='cnt', lag_features=None):
+        """
+        :param columns: names of design matrix columns in the order of coefficients
+        :param coefficients:
+        :param intercept:
+        :param encoder: fitted HotEncoder
+        :param scaler: fitted MinMaxScaler, which covers the target
+        :param target: scaled column being predicted
+        :param lag_features: LagFeatures holding the history that follows the training data
+        """
+        self.columns = list(columns)
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.intercept = float(intercept)
+        self.encoder = encoder
+        self.scaler = scaler
+        self.target = target
+        self.lag_features = lag_features
+        positions = {column: i for i, column in enumerate(self.columns)}
+        encoded = [positions[name] for name in encoder.feature_names]
+        self.plain = [column for column in self.columns if column not in set(encoder.feature_names)]
+        self.plain_coefficients = self.coefficients[[positions[column] for column in self.plain]]
+        # unknown categories get code -1, which picks the trailing zero
+        self.encoded_coefficients = np.append(self.coefficients[encoded], 0.0)
+
+    @classmethod
+    def from_estimator(cls, estimator, columns, encoder, scaler, target='cnt', lag_features=None):
+        """
+        Bundles a fitted linear model, e.g. RidgeCV or its sklearn counterpart.
+        :param estimator: fitted model with coef_ and intercept_
+        :param columns: design matrix columns used for fitting
+        :param encoder:
+        :param scaler:
+        :param target:
+        :param lag_features:
+        :return:
+        """
+        return cls(columns, estimator.coef_, estimator.intercept_, encoder, scaler, target, lag_features)
+
+    @property
+    def inputs(self):
+        """
+        Raw columns required for scoring. Lag features are not among them, they are computed from the history and
+        the optional observed values in the column named after them.
+        :return:
+        """
+        lags = set(self.lag_features.feature_names) if self.lag_features is not None else set()
+        return [column for column in self.plain if column not in lags] + self.encoder.labels
+
+    def predict_scaled(self, features):
+        """
+        Predicts the target in scaled units. Missing lag features are computed in order of rows, which extend the
+        history of the model by one hour each, rows without an observed value as unknown hours.
+        :param features: data frame or mapping of column to values
+        :return: array of predictions
+        """
+        columns = {column: np.asarray(features[column], dtype=float) for column in self.inputs
+                   if column in self.plain}
+        codes = self.encoder.codes(features)
+        missing = [column for column in self.plain if column not in columns]
+        if missing and all(column in features for column in missing):
+            columns.update((column, np.asarray(features[column], dtype=float)) for column in missing)
+        elif missing:
+            name = self.lag_features.name
+            observed = np.asarray(features[name], dtype=float) if name in features else np.full(len(codes), np.nan)
+            columns.update(zip(self.lag_features.feature_names, self.lag_features.update(observed).T))
+        plain = np.column_stack([columns[column] for column in self.plain])
+        encoded = self.encoded_coefficients[codes].sum(axis=1)
+        return plain.dot(self.plain_coefficients) + encoded + self.intercept
+
+    def predict(self, features):
+        """
+        Predicts the target in original units.
+        :param features: data frame or mapping of column to values
+        :return: array of predictions
+        """
+        return self.scaler.inverse_transform(self.predict_scaled(features), self.target)
+
+    def to_dict(self):
+        return {
+            'columns': self.columns,
+            'coefficients': self.coefficients.tolist(),
+            'intercept': self.intercept,
+            'encoder': self.encoder.to_dict(),
+            'scaler': self.scaler.to_dict(),
+            'target': self.target,
+            'lag_features': self.lag_features.to_dict() if self.lag_features is not None else None
+        }
+
+    @classmethod
+    def from_dict(cls, parameters):
+        return cls(parameters['columns'], parameters['coefficients'], parameters['intercept'],
+                   HotEncoder.from_dict(parameters['encoder']), MinMaxScaler.from_dict(parameters['scaler']),
+                   parameters['target'], LagFeatures.from_dict(parameters['lag_features'])
+                   if parameters.get('lag_features') else None)
+
+    def save(self, path):
+        """
+        Stores the bundle as JSON.
+        :param path:
+        :return:
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
 def show_prediction(actual, forecast, title=''):
     """
     Visualizes a comparison of actual data vs forecast.
@@ -110,6 +791,7 @@ def show_prediction(actual, forecast, title=''):
     :param title:
     :return:
     """
+    import matplotlib.pyplot as plt
     plt.scatter(actual.index.values, actual, c='k', label='Data')
     plt.plot(forecast, c='g', label='Forecast')
     plt.title(title)
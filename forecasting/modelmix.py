@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import functools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import datamix as dm
+import matmix as mt
+
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+# feature preparation of the bike sharing forecaster
+fields_to_encode = ['season', 'yr', 'mnth', 'weekday', 'weathersit']
+hour_fields_to_encode = fields_to_encode + ['hr']
+fields_to_normalize = ['casual', 'registered', 'cnt']
+fields_to_drop = ['instant', 'casual', 'registered', 'temp', 'hum', 'windspeed']
+target_field = 'cnt'
+
+
+def get_fields_to_encode(path):
+    return hour_fields_to_encode if 'hour' in path else fields_to_encode
+
+
+def design(data, encoder, scaler, drop=fields_to_drop, target=target_field):
+    """
+    Turns raw rows into a design matrix and a scaled target, the same way the in-memory pipeline of data-science.py
+    does it.
+    :param data: raw rows, e.g. a chunk of read_bike_chunks
+    :param encoder: fitted HotEncoder
+    :param scaler: fitted MinMaxScaler
+    :param drop: fields not used by the model
+    :param target:
+    :return: design matrix and target
+    """
+    features = data.copy()
+    mt.hot_encode(features, encoder.labels, encoder)
+    scaler.transform(features, inplace=True)
+    features.drop(drop, axis=1, inplace=True)
+    return features.drop([target], axis=1), features[target]
+
+
+def scan(path, labels, columns=fields_to_normalize, chunk_size=100000):
+    """
+    First pass over a data file: learns the encoder and the scaler and counts rows.
+    :param path:
+    :param labels: fields to encode
+    :param columns: fields to normalize
+    :param chunk_size:
+    :return: encoder, scaler and number of rows
+    """
+    encoder, scaler, n = mt.HotEncoder(), mt.MinMaxScaler(), 0
+    for chunk in dm.read_bike_chunks(path, chunk_size):
+        encoder.partial_fit(chunk, labels)
+        scaler.partial_fit(chunk, columns)
+        n += len(chunk)
+    return encoder, scaler, n
+
+
+def fit_streaming(path, alphas=np.arange(0, 10, .2), cv=10, chunk_size=100000, labels=None, workers=None):
+    """
+    Fits the ridge forecaster on a data file of any length with memory bounded by the chunk size. The first pass
+    learns the encoder and the scaler, the second one accumulates sufficient statistics of every fold, so that the
+    result equals RidgeCV fitted on the whole file at once.
+    :param path:
+    :param alphas: regularization grid
+    :param cv: number of contiguous folds
+    :param chunk_size: number of rows read at once
+    :param labels: fields to encode, defaults to get_fields_to_encode(path)
+    :param workers: number of threads scoring folds
+    :return: RidgeModel and the fitted RidgeCV
+    """
+    labels = labels or get_fields_to_encode(path)
+    encoder, scaler, n = scan(path, labels, chunk_size=chunk_size)
+    logging.info('Accumulating statistics of {} rows in {} folds'.format(n, cv))
+    bounds = mt.fold_bounds(n, cv)
+    statistics = [None] * cv
+    offset, columns = 0, None
+    for chunk in dm.read_bike_chunks(path, chunk_size):
+        x, y = design(chunk, encoder, scaler)
+        columns = x.columns
+        x, y = x.to_numpy(dtype=float), y.to_numpy(dtype=float)
+        end = offset + len(y)
+        # a chunk may span several folds
+        for fold in range(cv):
+            start, stop = max(bounds[fold], offset) - offset, min(bounds[fold + 1], end) - offset
+            if start < stop:
+                statistics[fold] = mt.add_statistics(statistics[fold], mt.ridge_statistics(x[start:stop], y[start:stop]))
+        offset = end
+    clf = mt.RidgeCV(alphas, cv, workers).fit_statistics(statistics, bounds)
+    return mt.RidgeModel.from_estimator(clf, columns, encoder, scaler), clf
+
+
+def backtest_splits(n, initial, horizon, step=None, window=None):
+    """
+    Rolling-origin splits of time-ordered rows. Every fold trains on rows before its origin and tests on the
+    following horizon, origins move forward by step.
+    :param n: number of rows
+    :param initial: number of training rows of the first fold
+    :param horizon: number of test rows of every fold, the last fold may be shorter
+    :param step: distance between origins, defaults to horizon
+    :param window: number of training rows of a rolling window, training windows expand if not provided
+    :return: list of (train start, origin, test end)
+    """
+    step = step or horizon
+    return [(max(0, origin - window) if window else 0, origin, min(origin + horizon, n))
+            for origin in range(initial, n, step)]
+
+
+def backtest_date_splits(dates, initial, horizon, step=None, window=None):
+    """
+    Rolling-origin splits of rows indexed by sorted dates, periods are given in days, so that hourly data with missing
+    hours is split the same way as daily data.
+    :param dates: sorted dates of rows, e.g. index of load_bike_data
+    :param initial: days of training data of the first fold
+    :param horizon: days tested by every fold
+    :param step: days between origins, defaults to horizon
+    :param window: days of training data of a rolling window, training windows expand if not provided
+    :return: list of (train start, origin, test end) row positions
+    """
+    dates = pd.DatetimeIndex(dates)
+    day = pd.Timedelta(days=1)
+    splits = list()
+    for origin in pd.date_range(dates[0] + initial * day, dates[-1], freq='{}D'.format(step or horizon)):
+        start = dates.searchsorted(origin - window * day) if window else 0
+        splits.append((start, dates.searchsorted(origin), dates.searchsorted(origin + horizon * day)))
+    return [split for split in splits if split[0] < split[1] < split[2]]
+
+
+def _share(matrix):
+    """
+    Copies an array into shared memory once.
+    :param matrix:
+    :return: spec for _attach and shared memory handle to be released by the caller
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=float)
+    handle = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=handle.buf)[:] = matrix
+    return (handle.name, matrix.shape, matrix.dtype.str), handle
+
+
+def _attach(spec):
+    """
+    Maps an array shared with _share without copying it.
+    :param spec:
+    :return: array and shared memory handle that has to stay open while the array is used
+    """
+    name, shape, dtype = spec
+    handle = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=handle.buf), handle
+
+
+def _unpack(augmented):
+    """
+    Converts statistics of augmented rows [1, x, y] into ridge_statistics.
+    :param augmented: (features + 2) x (features + 2) gram matrix
+    :return:
+    """
+    return (augmented[0, :1], augmented[0, 1:-1], augmented[0, -1:], augmented[1:-1, 1:-1], augmented[1:-1, -1],
+            augmented[-1, -1:])
+
+
+def _block_statistics(data, statistics, block, start, stop):
+    """
+    Process pool worker, stores statistics of rows [start, stop) of the shared design matrix as block of the shared
+    statistics array.
+    :return:
+    """
+    rows, data_handle = _attach(data)
+    result, statistics_handle = _attach(statistics)
+    augmented = np.column_stack((np.ones(stop - start), rows[start:stop]))
+    result[block] = augmented.T.dot(augmented)
+    del rows, result
+    data_handle.close()
+    statistics_handle.close()
+
+
+def _run_fold(data, statistics, edges, first, last, alphas, test_end, scale):
+    """
+    Process pool worker, fits a fold on blocks [first, last) of shared statistics and evaluates it on the rows that
+    follow. With several alphas, the blocks of the training window serve as cross-validation folds.
+    :return: alpha and ErrorMetrics of the fold in original units
+    """
+    rows, data_handle = _attach(data)
+    blocks, statistics_handle = _attach(statistics)
+    fold_statistics = [_unpack(blocks[i].copy()) for i in range(first, last)]
+    if len(alphas) > 1 and last - first > 1:
+        clf = mt.RidgeCV(alphas, workers=1).fit_statistics(fold_statistics, edges[first:last + 1] - edges[first])
+        alpha, coefficients, intercept = clf.alpha_, clf.coef_, clf.intercept_
+    else:
+        coefficients, intercepts = mt.ridge_path(functools.reduce(mt.add_statistics, fold_statistics), alphas[:1])
+        alpha, coefficients, intercept = float(alphas[0]), coefficients[:, 0], intercepts[0]
+    test = rows[edges[last]:test_end]
+    minimum, width = scale
+    forecast = test[:, :-1].dot(coefficients) + intercept
+    metrics = mt.ErrorMetrics().update(test[:, -1] * width + minimum, forecast * width + minimum)
+    del rows, blocks, test
+    data_handle.close()
+    statistics_handle.close()
+    return alpha, metrics
+
+
+def backtest(x, y, splits, alphas=np.arange(0, 10, .2), scale=(0.0, 1.0), block=None, workers=None):
+    """
+    Evaluates the ridge forecaster on rolling-origin splits in parallel. The design matrix is put into shared memory
+    once, split into blocks at every fold boundary, and statistics of every block are computed once by the pool.
+    A fold then assembles its training statistics from the blocks it covers instead of reading its rows again, so
+    every next fold of an expanding window only adds the blocks of its step.
+    :param x: design matrix of time-ordered rows
+    :param y: target
+    :param splits: as returned by backtest_splits
+    :param alphas: regularization grid, the blocks of a training window are used to choose from it
+    :param scale: minimum and range of the target, so that errors are reported in original units
+    :param block: number of rows per block, defaults to the distance between origins
+    :param workers: number of processes, defaults to the number of cores
+    :return: list of per-fold results and ErrorMetrics over all folds
+    :raises ValueError: if there are no splits
+    """
+    if not splits:
+        raise ValueError('no splits to backtest')
+    alphas = np.atleast_1d(np.asarray(alphas, dtype=float))
+    data = np.column_stack((np.asarray(x, dtype=float), np.asarray(y, dtype=float)))
+    width = data.shape[1] + 1
+    starts, origins = [split[0] for split in splits], [split[1] for split in splits]
+    block = block or (origins[1] - origins[0] if len(origins) > 1 else origins[0])
+    edges = np.unique(np.concatenate((starts, origins, np.arange(min(starts), max(origins), block))))
+    data_spec, data_handle = _share(data)
+    statistics_handle = shared_memory.SharedMemory(create=True, size=max((len(edges) - 1) * width**2 * 8, 1))
+    statistics_spec = (statistics_handle.name, (len(edges) - 1, width, width), np.dtype(float).str)
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_block_statistics, data_spec, statistics_spec, block, start, stop)
+                       for block, (start, stop) in enumerate(zip(edges[:-1], edges[1:]))]
+            for future in futures:
+                future.result()
+            futures = [executor.submit(_run_fold, data_spec, statistics_spec, edges, np.searchsorted(edges, start),
+                                       np.searchsorted(edges, origin), alphas, test_end, scale)
+                       for start, origin, test_end in splits]
+            folds, total = list(), mt.ErrorMetrics()
+            for (start, origin, test_end), future in zip(splits, futures):
+                alpha, metrics = future.result()
+                total.merge(metrics)
+                folds.append({'train': (start, origin), 'test': (origin, test_end), 'alpha': alpha,
+                              'measures': metrics.result()})
+        return folds, total
+    finally:
+        for handle in (data_handle, statistics_handle):
+            handle.close()
+            handle.unlink()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import json
+import logging
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+
+import matmix as mt
+import utilmix as ut
+
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+def score_records(model, records):
+    """
+    Scores a batch of raw rows with a single vectorized pass. For a model with lag features, rows are taken as
+    consecutive hours following the ones seen so far. Every row takes one hour of the history, with its observed count
+    if provided, so predictions that depend on hours without counts are undefined.
+    :param model: RidgeModel
+    :param records: list of mappings of column to value, e.g. rows of day.csv or hour.csv
+    :return: array of predicted ride counts
+    """
+    columns = {column: np.array([record[column] for record in records]) for column in model.inputs}
+    if model.lag_features is not None:
+        name = model.lag_features.name
+        columns[name] = np.array([record.get(name) for record in records], dtype=float)
+    return model.predict(columns)
+
+
+def format_predictions(model, records):
+    """
+    Scores a batch and renders one prediction per line. If the batch fails, rows are scored one by one and rows that
+    can not be scored are rendered as null.
+    :param model:
+    :param records: list of JSON encoded rows
+    :return:
+    """
+    try:
+        predictions = score_records(model, [json.loads(record) for record in records])
+        # predictions are undefined while the history of lag features is too short
+        return ''.join('null\n' if np.isnan(value) else '{:.1f}\n'.format(value) for value in predictions)
+    except (ValueError, KeyError, TypeError):
+        if len(records) == 1:
+            logging.warning('Can not score {}'.format(records[0]))
+            return 'null\n'
+        return ''.join(format_predictions(model, [record]) for record in records)
+
+
+def serve_stream(model, batch_size, source=sys.stdin.buffer, sink=sys.stdout):
+    """
+    Scores JSON lines from a stream. Every read returns all lines available at the moment, they are scored together
+    in micro-batches of up to batch_size rows, so that a busy stream is scored in large batches and a single request
+    is answered right away.
+    :param model:
+    :param batch_size:
+    :param source: binary input stream
+    :param sink: text output stream
+    :return:
+    """
+    fd = source.fileno()
+    pending = b''
+    while True:
+        chunk = os.read(fd, 1 << 16)
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop() if chunk else b''
+        lines = [line for line in lines if line.strip()]
+        for start in range(0, len(lines), batch_size):
+            sink.write(format_predictions(model, lines[start:start+batch_size]))
+        sink.flush()
+        if not chunk:
+            break
+
+
+def get_request_handler(model):
+    """
+    HTTP handler answering POST requests with a JSON list of rows by a JSON list of predictions.
+    :param model:
+    :return:
+    """
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            try:
+                records = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                predictions = score_records(model, records)
+                body = json.dumps([None if np.isnan(value) else value for value in predictions.tolist()])
+                status = 200
+            except (ValueError, KeyError, TypeError) as e:
+                body, status = json.dumps({'error': str(e)}), 400
+            body = body.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return ScoringHandler
+
+
+if __name__ == '__main__':
+    ut.set_logging()
+    parser = ut.get_cli_parser()
+    parser.add_option("-m", "--model", dest="model_path", default=ut.join_paths(ut.get_script_path(), 'model.json'),
+                      help="model bundle stored by data-science.py")
+    parser.add_option("-b", "--batch", dest="batch_size", type="int", default=1024,
+                      help="maximal number of rows scored at once")
+    parser.add_option("-p", "--port", dest="port", type="int", default=None,
+                      help="serve over HTTP on a local port instead of scoring JSON lines from stdin")
+    opts = ut.parse_cli_options(parser)
+
+    model = mt.RidgeModel.load(opts.model_path)
+    if opts.port:
+        logging.info('Serving {} on http://127.0.0.1:{}'.format(opts.model_path, opts.port))
+        HTTPServer(('127.0.0.1', opts.port), get_request_handler(model)).serve_forever()
+    else:
+        serve_stream(model, opts.batch_size)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import logging
+
+import numpy as np
+
+import modelmix as md
+import utilmix as ut
+
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+ut.set_logging()
+parser = ut.get_cli_parser()
+parser.add_option("-f", "--file", dest="filename", default=ut.join_paths(ut.get_script_path(), 'data', 'hour.csv'),
+                  help="data file, read in chunks")
+parser.add_option("-m", "--model", dest="model_path", default=ut.join_paths(ut.get_script_path(), 'model.json'),
+                  help="where to store the model bundle for score.py")
+parser.add_option("-c", "--chunk-size", dest="chunk_size", type="int", default=100000,
+                  help="number of rows held in memory at once")
+parser.add_option("--cv", dest="cv", type="int", default=10, help="number of cross-validation folds")
+opts = ut.parse_cli_options(parser)
+
+logging.info('Fitting a model on {} in chunks of {} rows'.format(opts.filename, opts.chunk_size))
+model, clf = md.fit_streaming(opts.filename, np.arange(0, 10, .2), opts.cv, opts.chunk_size)
+print('Model parameters: {}'.format({'alpha': clf.alpha_}))
+print('Cross-validated {0}: {1:.4f}'.format(clf.scoring, clf.best_score_))
+logging.info('Storing the model in {}'.format(opts.model_path))
+model.save(opts.model_path)
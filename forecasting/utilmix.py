@@ -49,13 +49,14 @@ def get_cli_parser(usage='usage: %prog [options] arg', include_verbose=False):
 
 def parse_cli_options(parser):
     """
-    Parses options and removes empty spaces in option values.
+    Parses options and removes empty spaces in string option values.
     :param parser:
     :return: stripped options
     """
     (opts, args) = parser.parse_args()
-    for key in opts.__dict__.keys():
-        opts.__dict__[key] = opts.__dict__[key].strip()
+    for key, value in opts.__dict__.items():
+        if isinstance(value, str):
+            opts.__dict__[key] = value.strip()
     return opts
 
 
@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from optparse import OptionParser
+
+import numpy as np
+
+import isaxindex as ix
+import matutil as mt
+import mining as mn
+import parallel as pl
+import saxstream as ss
+from saxword import SaxWords
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+def random_walks(m, n, seed=0):
+    """
+    Generates a matrix of normalized random walks
+    :param m: number of series
+    :param n: series length
+    :param seed:
+    :return:
+    """
+    np.random.seed(seed)
+    matrix = np.cumsum(np.random.randn(m, n), axis=1)
+    return (matrix - matrix.mean(axis=1, keepdims=True)) / matrix.std(axis=1, keepdims=True)
+
+
+def best_time(func, repeat=3):
+    """
+    Measures the best wall clock time of several runs of provided function
+    :param func:
+    :param repeat:
+    :return:
+        time in seconds
+    """
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def bench_sax(m=1000, n=256, w=16, c=16):
+    """
+    Compares per-series SAX encoding against the batch encoder on the same data
+    :param m: number of series
+    :param n: series length
+    :param w: word length
+    :param c: cardinality
+    :return:
+        per-series time, batch time
+    """
+    matrix = random_walks(m, n)
+    words = np.asarray([mt.sax(series, w, c, 'integer') for series in matrix], dtype=int)
+    assert (words == mt.sax_batch(matrix, w, c)).all()
+    looped = best_time(lambda: [mt.sax(series, w, c, 'integer') for series in matrix])
+    batched = best_time(lambda: mt.sax_batch(matrix, w, c))
+    return looped, batched
+
+
+def bench_mindist(m=200, n=256, w=16, c=16):
+    """
+    Compares pairwise mindist on string symbols against the vectorized integer word version
+    :param m: number of series
+    :param n: series length
+    :param w: word length
+    :param c: cardinality
+    :return:
+        per-pair time, vectorized time
+    """
+    matrix = random_walks(m, n)
+    words = mt.sax_batch(matrix, w, c)
+    symbolic = [list(word) for word in mt.sax_batch(matrix, w, c, 'binary')]
+    looped = best_time(lambda: [[mt.mindist(n, s1, s2, c) for s2 in symbolic] for s1 in symbolic], repeat=1)
+    batched = best_time(lambda: mt.mindist_words(n, words, words, c))
+    return looped, batched
+
+
+def bench_isax(m=20000, n=128, w=16, k=5, queries=20):
+    """
+    Compares exact k-NN search in an iSAX index against a full scan
+    :param m: number of indexed series
+    :param n: series length
+    :param w: word length
+    :param k: number of neighbours
+    :param queries: number of queries
+    :return:
+        build time, full scan time, exact search time, approximate search time
+    """
+    matrix = random_walks(m, n)
+    targets = random_walks(queries, n, seed=1)
+    index = ix.ISaxIndex(n, w)
+    build = best_time(lambda: ix.ISaxIndex(n, w).insert(matrix), repeat=1)
+    index.insert(matrix)
+    scan = best_time(lambda: [np.sort(mt.distance(query, matrix))[:k] for query in targets])
+    exact = best_time(lambda: [index.exact_search(query, k) for query in targets])
+    approximate = best_time(lambda: [index.approximate_search(query, k) for query in targets])
+    return build, scan, exact, approximate
+
+
+def bench_stream(length=5000, n=1000, w=100, c=256):
+    """
+    Compares streaming sliding window SAX against normalizing and encoding every window from scratch
+    :param length: stream length
+    :param n: window length
+    :param w: word length
+    :param c: cardinality
+    :return:
+        recompute time, streaming time
+    """
+    samples = mt.random_walk(length)
+    windows = [samples[i:i+n] for i in range(length - n + 1)]
+    recompute = best_time(lambda: [mt.sax_batch(mt.normalize(window), w, c) for window in windows], repeat=1)
+    streaming = best_time(lambda: list(ss.stream_sax(samples, n, w, c)), repeat=1)
+    return recompute, streaming
+
+
+def bench_parallel(m=100000, n=256, w=16, c=256, transform='sax', pool='process'):
+    """
+    Measures parallel encoding time for 1 up to the number of cores workers
+    :param m: number of series
+    :param n: series length
+    :param w: word length
+    :param c: cardinality
+    :param transform: sax, paa or dft
+    :param pool: process or thread
+    :return:
+        list of (workers, time) pairs
+    """
+    matrix = random_walks(m, n)
+    cores = os.cpu_count() or 1
+    counts = sorted({1, cores} | {2**i for i in range(cores.bit_length()) if 2**i <= cores})
+    return [(workers, best_time(lambda: pl.encode(matrix, w, c, transform, d=w, workers=workers, pool=pool)))
+            for workers in counts]
+
+
+def bench_dft(m=20000, n=256, w=16, c=256, d=16, k=5, queries=20):
+    """
+    Compares k-NN search pruned by truncated DFT distance against the SAX path pruned by mindist on the same data, both
+    with equal number of features per series
+    :param m: number of series
+    :param n: series length
+    :param w: word length
+    :param c: cardinality
+    :param d: number of DFT coefficients
+    :param k: number of neighbours
+    :param queries: number of queries
+    :return:
+        dict of (search time, average share of series with computed true distance) per method
+    """
+    matrix = random_walks(m, n)
+    targets = random_walks(queries, n, seed=1)
+    coefficients = mt.dft(matrix, d)
+    words = mt.sax_batch(matrix, w, c)
+    methods = {
+        'scan': lambda query: mt.knn_search(query, matrix, np.zeros(m), k, batch=m),
+        'dft': lambda query: mt.knn_search(query, matrix, mt.dft_distance(n, mt.dft(query, d), coefficients), k),
+        'sax': lambda query: mt.knn_search(query, matrix, mt.mindist_words(n, mt.sax_batch(query, w, c)[0], words, c),
+                                           k)
+    }
+    results = dict()
+    for name, search in methods.items():
+        elapsed = best_time(lambda: [search(query) for query in targets])
+        computed = np.mean([search(query)[2] for query in targets]) / m
+        results[name] = elapsed, computed
+    return results
+
+
+def brute_force_discord(series, n):
+    """
+    Finds the top discord by comparing every pair of subsequences
+    :param series:
+    :param n: subsequence length
+    :return:
+        position, nearest neighbour distance
+    """
+    subsequences = mn.Subsequences(series, n)
+    normalized = subsequences.normalized(np.arange(subsequences.m))
+    best = (None, 0.0)
+    for i in range(subsequences.m):
+        distances = mt.distance(normalized[i], normalized)
+        distances[max(0, i - n + 1):i + n] = np.inf
+        if best[1] < distances.min() < np.inf:
+            best = (i, distances.min())
+    return best
+
+
+def bench_discords(length=5000, n=128):
+    """
+    Compares HOT SAX discord discovery against brute force on a random walk
+    :param length: series length
+    :param n: subsequence length
+    :return:
+        brute force time, HOT SAX time
+    """
+    np.random.seed(0)
+    series = mt.random_walk(length)
+    assert brute_force_discord(series, n)[0] == mn.discords(series, n)[0][0]
+    brute = best_time(lambda: brute_force_discord(series, n), repeat=1)
+    heuristic = best_time(lambda: mn.discords(series, n), repeat=1)
+    return brute, heuristic
+
+
+def bench_word_memory(m=10000, n=256, w=16, c=256, representation='binary'):
+    """
+    Estimates memory per million words stored as lists of strings, as returned by matutil.sax, and as SaxWords
+    :param m: number of sampled words
+    :param n: series length
+    :param w: word length
+    :param c: cardinality
+    :param representation: binary, letter, integer
+    :return:
+        bytes per million words for lists of strings, integer codes and bit-packed codes
+    """
+    matrix = random_walks(m, n)
+    words = SaxWords.encode(matrix, w, c)
+    # as in matutil.sax, symbols are string objects shared with the alphabet, so only the lists grow with words
+    listed = sum(sys.getsizeof(word) for word in words.symbols(representation))
+    compact = words.nbytes
+    packed = words.pack().nbytes
+    scale = 10**6 / m
+    return listed * scale, compact * scale, packed * scale
+
+
+def bench_cache(c=256, representation='binary', number=1000):
+    """
+    Measures per-call time of breakpoint, alphabet and distance table generation with and without the cache
+    :param c: cardinality
+    :param representation: binary, letter, integer
+    :param number: number of calls
+    :return:
+        dict of (uncached, cached) time per call in seconds
+    """
+    functions = {
+        'qnorm': (mt.qnorm, (c,)),
+        'generate_symbols': (mt.generate_symbols, (c, representation)),
+        'mindist_table': (mt.mindist_table, (c,))
+    }
+    mt.warm_cache([c], [representation])
+    results = dict()
+    for name, (function, args) in functions.items():
+        uncached = min(timeit.repeat(lambda: function.__wrapped__(*args), number=number // 10, repeat=3))
+        cached = min(timeit.repeat(lambda: function(*args), number=number, repeat=3))
+        results[name] = uncached / (number // 10), cached / number
+    return results
+
+
+def bench_import(module, path=None, heavy=('matplotlib', 'scipy.stats', 'sklearn')):
+    """
+    Measures import time of a module in a fresh interpreter and lists heavy dependencies it pulls in
+    :param module: module name
+    :param path: directory of the module, defaults to the directory of this script
+    :param heavy: modules considered heavy
+    :return:
+        import time in seconds, list of loaded heavy modules
+    """
+    path = path or os.path.dirname(os.path.realpath(__file__))
+    code = ('import sys, time; start = time.perf_counter(); import {}; elapsed = time.perf_counter() - start; '
+            'print(elapsed); print(",".join(m for m in {!r} if m in sys.modules))').format(module, list(heavy))
+    output = subprocess.run([sys.executable, '-c', code], cwd=path, stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True).stdout.split('\n')
+    return float(output[0]), list(filter(None, output[1].split(',')))
+
+
+# parameters of a sweep, every primitive only varies the parameters it depends on
+SWEEP = {
+    'lengths': (256, 1024, 4096),
+    'word_lengths': (8, 32, 128),
+    'cardinalities': (4, 16, 256),
+    'batches': (100, 1000, 10000)
+}
+QUICK_SWEEP = {
+    'lengths': (256, 1024),
+    'word_lengths': (8, 32),
+    'cardinalities': (4, 256),
+    'batches': (100, 1000)
+}
+
+# name: (parameters it depends on, setup building arguments from data and parameters, measured function)
+PRIMITIVES = {
+    'paa': (('m', 'n', 'w'), lambda matrix, p: (matrix, p['w']), mt.paa),
+    'sax': (('m', 'n', 'w', 'c'), lambda matrix, p: (matrix, p['w'], p['c']), mt.sax_batch),
+    'mindist': (('m', 'n', 'w', 'c'),
+                lambda matrix, p: (p['n'], mt.sax_batch(matrix[0], p['w'], p['c'])[0],
+                                   mt.sax_batch(matrix, p['w'], p['c']), p['c']),
+                mt.mindist_words),
+    'distance': (('m', 'n'), lambda matrix, p: (matrix[0], matrix), mt.distance),
+    'dft': (('m', 'n', 'w'), lambda matrix, p: (matrix, p['w']),
+            lambda matrix, d: np.fft.irfft(mt.dft(matrix, d), matrix.shape[-1]))
+}
+
+
+def peak_memory(func, *args):
+    """
+    Measures peak memory allocated while running provided function
+    :param func:
+    :param args:
+    :return:
+        peak in bytes
+    """
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def sweep(grid=None, primitives=None, repeat=3, seed=0):
+    """
+    Benchmarks primitives over a grid of batch sizes, series lengths, word lengths and cardinalities on random walks
+    with a fixed seed
+    :param grid: dict of lengths, word_lengths, cardinalities and batches, defaults to SWEEP
+    :param primitives: names of primitives to run, defaults to all of PRIMITIVES
+    :param repeat: number of timed runs, the best one is kept
+    :param seed:
+    :return:
+        list of result records
+    """
+    grid = grid or SWEEP
+    records = list()
+    for name in primitives or sorted(PRIMITIVES):
+        depends, setup, func = PRIMITIVES[name]
+        seen = set()
+        for m, n, w, c in itertools.product(grid['batches'], grid['lengths'], grid['word_lengths'],
+                                            grid['cardinalities']):
+            params = {'m': m, 'n': n, 'w': w, 'c': c}
+            key = tuple((k, params[k]) for k in depends)
+            if key in seen or w > n:
+                continue
+            seen.add(key)
+            args = setup(random_walks(m, n, seed), params)
+            seconds = best_time(lambda: func(*args), repeat)
+            record = {'primitive': name, 'seconds': seconds, 'throughput': m / seconds if seconds else float('inf'),
+                      'peak_bytes': peak_memory(func, *args)}
+            record.update(dict(key))
+            records.append(record)
+    return records
+
+
+def record_key(record):
+    return tuple(sorted((k, v) for k, v in record.items() if k in ('primitive', 'm', 'n', 'w', 'c')))
+
+
+def compare(records, baseline, tolerance=0.25):
+    """
+    Flags results that are slower or take more memory than the baseline by more than the tolerance
+    :param records: results of sweep
+    :param baseline: results of an earlier sweep
+    :param tolerance: allowed relative degradation
+    :return:
+        list of (record, baseline record, reasons) for regressions
+    """
+    previous = {record_key(record): record for record in baseline}
+    regressions = list()
+    for record in records:
+        old = previous.get(record_key(record))
+        if old is None:
+            continue
+        reasons = list()
+        if record['throughput'] < old['throughput'] * (1 - tolerance):
+            reasons.append('throughput {:.1f} < {:.1f}'.format(record['throughput'], old['throughput']))
+        if record['peak_bytes'] > old['peak_bytes'] * (1 + tolerance):
+            reasons.append('peak memory {} > {}'.format(record['peak_bytes'], old['peak_bytes']))
+        if reasons:
+            regressions.append((record, old, reasons))
+    return regressions
+
+
+def run_comparisons():
+    """
+    Prints comparisons of optimized paths against the ones they replace
+    :return:
+    """
+    for m, n, w, c in [(1000, 256, 16, 16), (1000, 1024, 64, 256), (10000, 128, 8, 8)]:
+        looped, batched = bench_sax(m, n, w, c)
+        print('sax m={} n={} w={} c={}: per-series {:.4f}s, batch {:.4f}s, speedup x{:.1f}'.format(
+            m, n, w, c, looped, batched, looped / batched))
+    for m, n, w, c in [(200, 256, 16, 16), (100, 1024, 64, 256)]:
+        looped, batched = bench_mindist(m, n, w, c)
+        print('mindist m={} n={} w={} c={}: per-pair {:.4f}s, vectorized {:.4f}s, speedup x{:.1f}'.format(
+            m, n, w, c, looped, batched, looped / batched))
+    build, scan, exact, approximate = bench_isax()
+    print('isax m=20000 n=128 w=16: build {:.4f}s, full scan {:.4f}s, exact {:.4f}s, approximate {:.4f}s'.format(
+        build, scan, exact, approximate))
+    recompute, streaming = bench_stream()
+    print('stream length=5000 n=1000 w=100 c=256: recompute {:.4f}s, streaming {:.4f}s, speedup x{:.1f}'.format(
+        recompute, streaming, recompute / streaming))
+    for pool in ('process', 'thread'):
+        timings = bench_parallel(pool=pool)
+        for workers, elapsed in timings:
+            print('parallel {} sax m=100000 n=256 w=16 c=256 workers={}: {:.4f}s, speedup x{:.1f}'.format(
+                pool, workers, elapsed, timings[0][1] / elapsed))
+    for name, (elapsed, computed) in bench_dft().items():
+        print('knn {} m=20000 n=256 features=16: {:.4f}s, true distances for {:.2f}% of series'.format(
+            name, elapsed, 100 * computed))
+    brute, heuristic = bench_discords()
+    print('discords length=5000 n=128: brute force {:.4f}s, HOT SAX {:.4f}s, speedup x{:.1f}'.format(
+        brute, heuristic, brute / heuristic))
+    for c in (16, 30, 256):
+        listed, compact, packed = bench_word_memory(c=c)
+        print('words w=16 c={} per million: strings {:.1f}MB, integer {:.1f}MB, packed {:.1f}MB'.format(
+            c, listed / 2**20, compact / 2**20, packed / 2**20))
+    for name, (uncached, cached) in bench_cache().items():
+        print('cache {} c=256: uncached {:.2f}us, cached {:.2f}us per call'.format(name, 1e6 * uncached, 1e6 * cached))
+    forecasting = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'forecasting')
+    for module, path in [('matutil', None), ('main', None), ('isaxindex', None), ('matmix', forecasting)]:
+        elapsed, loaded = bench_import(module, path)
+        print('import {}: {:.4f}s, heavy modules loaded: {}'.format(module, elapsed, ', '.join(loaded) or 'none'))
+
+
+def get_cli_parser():
+    parser = OptionParser('usage: %prog [options]')
+    parser.add_option('-o', '--output', dest='output', default=None, help='JSON file to write sweep results to')
+    parser.add_option('-b', '--baseline', dest='baseline', default=None, help='JSON results to compare against')
+    parser.add_option('-t', '--tolerance', dest='tolerance', type='float', default=0.25,
+                      help='allowed relative degradation of throughput or peak memory')
+    parser.add_option('-p', '--primitive', dest='primitives', action='append', default=None,
+                      help='primitive to benchmark, can be repeated: {}'.format(', '.join(sorted(PRIMITIVES))))
+    parser.add_option('--quick', dest='quick', action='store_true', default=False, help='use a smaller grid')
+    parser.add_option('--comparisons', dest='comparisons', action='store_true', default=False,
+                      help='run comparisons against replaced implementations instead of the sweep')
+    return parser
+
+
+if __name__ == '__main__':
+    opts, _ = get_cli_parser().parse_args()
+    if opts.comparisons:
+        run_comparisons()
+        exit()
+    records = sweep(QUICK_SWEEP if opts.quick else SWEEP, opts.primitives)
+    for record in records:
+        params = ' '.join('{}={}'.format(k, record[k]) for k in ('m', 'n', 'w', 'c') if k in record)
+        print('{} {}: {:.6f}s, {:.0f} series/s, peak {:.2f}MB'.format(
+            record['primitive'], params, record['seconds'], record['throughput'], record['peak_bytes'] / 2**20))
+    if opts.output:
+        results = {
+            'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                     'seed': 0},
+            'results': records
+        }
+        with open(opts.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            regressions = compare(records, json.load(f)['results'], opts.tolerance)
+        for record, old, reasons in regressions:
+            print('REGRESSION {}: {}'.format(' '.join('{}={}'.format(k, v) for k, v in record_key(record)),
+                                             ', '.join(reasons)))
+        if regressions:
+            exit(1)
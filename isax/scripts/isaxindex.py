@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import functools
+import heapq
+import os
+
+import numpy as np
+
+import matutil as mt
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+class Node:
+    """
+    Node of an iSAX tree. Every segment of the node word has its own cardinality 2**bits. Leaves keep ids of the series
+    they hold, internal nodes are split in two on a single segment by promoting its cardinality.
+    """
+    def __init__(self, bits, symbols, max_bits):
+        """
+        :param bits: number of bits per segment
+        :param symbols: symbols per segment in cardinality of the segment
+        :param max_bits: number of bits of full resolution words
+        """
+        self.bits = bits
+        self.symbols = symbols
+        # breakpoints of lower cardinalities are a subset of the full resolution ones
+        shift = max_bits - bits
+        self.lower = region_breakpoints(max_bits)[symbols << shift]
+        self.upper = region_breakpoints(max_bits)[(symbols + 1) << shift]
+        self.ids = list()
+        self.extent = None
+        self.split = None
+        self.children = None
+
+    def is_leaf(self):
+        return self.children is None
+
+    def route(self, word, max_bits):
+        """
+        Picks a child that provided full resolution word belongs to
+        :param word:
+        :param max_bits:
+        :return:
+        """
+        child_bits = self.bits[self.split] + 1
+        return self.children[(int(word[self.split]) >> (max_bits - child_bits)) & 1]
+
+
+@functools.lru_cache(maxsize=None)
+def region_breakpoints(bits):
+    """
+    Breakpoints of N(0, 1) regions for cardinality 2**bits enclosed by -inf and inf, so that symbol i stands for an
+    interval between elements i and i+1
+    :param bits:
+    :return:
+    """
+    breakpoints = np.concatenate(([-np.inf], mt.qnorm(2**bits), [np.inf]))
+    breakpoints.setflags(write=False)
+    return breakpoints
+
+
+class BaseISaxIndex:
+    """
+    Search over an iSAX tree of normalized series of equal length. Series are kept at full resolution SAX words of
+    cardinality 2**max_bits, the tree itself starts at cardinality 2 per segment. Subclasses decide how the tree is
+    built and where series are stored.
+    """
+    def __init__(self, n, w, max_bits=8, threshold=100):
+        """
+        :param n: series length
+        :param w: word length
+        :param max_bits: bits per segment of full resolution words, at most 16
+        :param threshold: maximal leaf size, leaves at full resolution may grow beyond it
+        """
+        self.n = n
+        self.w = w
+        self.max_bits = max_bits
+        self.threshold = threshold
+        self.root = dict()
+        self._root_bounds = None
+        self.size = 0
+        self.series = np.empty((0, n))
+        self.words = np.empty((0, w), dtype=mt.symbol_dtype(2**max_bits))
+
+    def lower_bound(self, node, aggregate):
+        """
+        Lower bound of distance between a query with provided PAA and any series under the node
+        :param node:
+        :param aggregate:
+        :return:
+        """
+        return mt.mindist_paa(self.n, aggregate, node.lower, node.upper)
+
+    def _stacked_root(self):
+        """
+        Root nodes along with their stacked region breakpoints, so that root bounds are computed at once
+        :return:
+        """
+        if self._root_bounds is None:
+            nodes = list(self.root.values())
+            lower = np.vstack([node.lower for node in nodes])
+            upper = np.vstack([node.upper for node in nodes])
+            self._root_bounds = nodes, lower, upper
+        return self._root_bounds
+
+    def _leaf_series(self, node):
+        """
+        Ids and series held by a leaf
+        :param node:
+        :return:
+        """
+        ids = np.asarray(node.ids, dtype=int)
+        return ids, self.series[ids]
+
+    def _scan(self, node, query, best, k):
+        """
+        Computes true distances to the series of a leaf and merges them into the k best (-distance, id) max-heap
+        :param node:
+        :param query:
+        :param best:
+        :param k:
+        :return:
+        """
+        ids, series = self._leaf_series(node)
+        for i, dist in zip(ids, mt.distance(query, series)):
+            if len(best) < k:
+                heapq.heappush(best, (-dist, i))
+            elif dist < -best[0][0]:
+                heapq.heapreplace(best, (-dist, i))
+
+    def approximate_search(self, query, k=1):
+        """
+        Finds approximate k nearest neighbours of a normalized query by scanning the leaf its word belongs to
+        :param query:
+        :param k:
+        :return:
+            ids and distances of found series sorted by distance
+        """
+        query = np.asarray(query, dtype=float)
+        best = list()
+        if self.root:
+            self._scan(self._approximate_leaf(query), query, best, k)
+        return _sorted(best)
+
+    def _approximate_leaf(self, query):
+        word = mt.sax_batch(query, self.w, 2**self.max_bits)[0]
+        node = self.root.get(tuple(word >> (self.max_bits - 1)))
+        if node is None:
+            aggregate = mt.paa(query, self.w)
+            node = min(self.root.values(), key=lambda child: self.lower_bound(child, aggregate))
+        while not node.is_leaf():
+            node = node.route(word, self.max_bits)
+        return node
+
+    def exact_search(self, query, k=1):
+        """
+        Finds exact k nearest neighbours of a normalized query. Starts from the approximate answer and visits nodes in
+        order of their lower bounds, skipping the ones that cannot contain a closer series.
+        :param query:
+        :param k:
+        :return:
+            ids and distances of found series sorted by distance
+        """
+        query = np.asarray(query, dtype=float)
+        best = list()
+        if not self.root:
+            return _sorted(best)
+        first = self._approximate_leaf(query)
+        self._scan(first, query, best, k)
+        aggregate = mt.paa(query, self.w)
+        nodes, lower, upper = self._stacked_root()
+        bounds = mt.mindist_paa(self.n, aggregate, lower, upper)
+        limit = -best[0][0] if len(best) == k else np.inf
+        # the counter breaks ties between nodes with equal bounds
+        queue = [(bounds[i], i, nodes[i]) for i in np.flatnonzero(bounds < limit)]
+        heapq.heapify(queue)
+        counter = len(nodes)
+        while queue:
+            bound, _, node = heapq.heappop(queue)
+            if len(best) == k and bound >= -best[0][0]:
+                break
+            if node is first:
+                continue
+            if node.is_leaf():
+                self._scan(node, query, best, k)
+            else:
+                for child in node.children:
+                    heapq.heappush(queue, (self.lower_bound(child, aggregate), counter, child))
+                    counter += 1
+        return _sorted(best)
+
+
+class ISaxIndex(BaseISaxIndex):
+    """
+    In-memory iSAX index, which grows by insertion. The cardinality of a single segment is promoted whenever a leaf
+    holds more than threshold series.
+    """
+    def _reserve(self, m):
+        """
+        Makes room for m more series, growing storage geometrically
+        :param m:
+        :return:
+        """
+        required = self.size + m
+        if required > self.series.shape[0]:
+            capacity = max(required, 2*self.series.shape[0], 1024)
+            series = np.empty((capacity, self.n))
+            series[:self.size] = self.series[:self.size]
+            words = np.empty((capacity, self.w), dtype=self.words.dtype)
+            words[:self.size] = self.words[:self.size]
+            self.series, self.words = series, words
+
+    def insert(self, matrix):
+        """
+        Inserts a series or a matrix of series (series x n) into the index
+        :param matrix:
+        :return:
+            ids of inserted series
+        """
+        matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+        m = matrix.shape[0]
+        self._reserve(m)
+        ids = np.arange(self.size, self.size + m)
+        self.series[ids] = matrix
+        self.words[ids] = mt.sax_batch(matrix, self.w, 2**self.max_bits)
+        self.size += m
+        for i in ids:
+            self._insert(i)
+        return ids
+
+    def _insert(self, i):
+        word = self.words[i]
+        key = tuple(word >> (self.max_bits - 1))
+        node = self.root.get(key)
+        if node is None:
+            node = Node(np.ones(self.w, dtype=int), np.array(key, dtype=int), self.max_bits)
+            self.root[key] = node
+            self._root_bounds = None
+        while not node.is_leaf():
+            node = node.route(word, self.max_bits)
+        node.ids.append(i)
+        if len(node.ids) > self.threshold:
+            self._split(node)
+
+    def _split(self, node):
+        """
+        Turns an overflowing leaf into an internal node, promoting cardinality of the segment that divides its series
+        most evenly
+        :param node:
+        :return:
+        """
+        candidates = np.flatnonzero(node.bits < self.max_bits)
+        if not len(candidates):
+            return
+        ids = np.asarray(node.ids)
+        shifts = self.max_bits - node.bits[candidates] - 1
+        next_bits = (self.words[ids][:, candidates] >> shifts.astype(self.words.dtype)) & 1
+        segment = candidates[np.abs(next_bits.mean(axis=0) - 0.5).argmin()]
+        bits = node.bits.copy()
+        bits[segment] += 1
+        children = list()
+        for bit in (0, 1):
+            symbols = node.symbols.copy()
+            symbols[segment] = 2*symbols[segment] + bit
+            children.append(Node(bits, symbols, self.max_bits))
+        node.split, node.children = segment, tuple(children)
+        for i in ids:
+            node.route(self.words[i], self.max_bits).ids.append(i)
+        node.ids = None
+        for child in children:
+            if len(child.ids) > self.threshold:
+                self._split(child)
+
+
+class DiskISaxIndex(BaseISaxIndex):
+    """
+    Read-only iSAX index stored in a directory. Series and words are kept in memory-mapped files ordered by leaves, so
+    that every leaf is a contiguous page and searches only read leaves that survive lower bound pruning. Only the tree
+    itself is loaded into memory when the index is opened.
+    """
+    def __init__(self, n, w, max_bits=8, threshold=1000):
+        super().__init__(n, w, max_bits, threshold)
+        self.path = None
+        self.ids = None
+
+    def _leaf_series(self, node):
+        start, end = node.extent
+        return self.ids[start:end], self.series[start:end]
+
+    def _build(self, node, ids):
+        """
+        Recursively splits a node until every leaf holds at most threshold series. Works on whole groups of ids
+        instead of one series at a time.
+        :param node:
+        :param ids:
+        :return:
+            leaves in depth first order
+        """
+        candidates = np.flatnonzero(node.bits < self.max_bits)
+        if len(ids) <= self.threshold or not len(candidates):
+            node.ids = ids
+            return [node]
+        words = self.words[ids]
+        shifts = (self.max_bits - node.bits[candidates] - 1).astype(words.dtype)
+        next_bits = (words[:, candidates] >> shifts) & 1
+        choice = np.abs(next_bits.mean(axis=0) - 0.5).argmin()
+        segment = candidates[choice]
+        bits = node.bits.copy()
+        bits[segment] += 1
+        children = list()
+        leaves = list()
+        for bit in (0, 1):
+            symbols = node.symbols.copy()
+            symbols[segment] = 2*symbols[segment] + bit
+            child = Node(bits, symbols, self.max_bits)
+            children.append(child)
+            leaves.extend(self._build(child, ids[next_bits[:, choice] == bit]))
+        node.split, node.children, node.ids = segment, tuple(children), None
+        return leaves
+
+    @classmethod
+    def bulk_load(cls, path, source, w, max_bits=8, threshold=1000, chunk=65536):
+        """
+        Builds an index in provided directory from a matrix of normalized series (series x n). The source only needs
+        to support slicing and row indexing, so it can be a memory-mapped file itself. Words are encoded chunk by chunk,
+        the tree is built on words alone and series are then copied in leaf order with large sequential writes.
+        :param path: index directory
+        :param source: matrix of series
+        :param w: word length
+        :param max_bits:
+        :param threshold: maximal leaf size
+        :param chunk: number of series encoded or written at once
+        :return:
+            opened index
+        """
+        m, n = source.shape
+        index = cls(n, w, max_bits, threshold)
+        os.makedirs(path, exist_ok=True)
+        words = np.lib.format.open_memmap(os.path.join(path, 'encoded.npy'), mode='w+',
+                                          dtype=index.words.dtype, shape=(m, w))
+        for start in range(0, m, chunk):
+            words[start:start+chunk] = mt.sax_batch(source[start:start+chunk], w, 2**max_bits)
+        index.words = words
+        # grouping series by their root words
+        keys = words >> (max_bits - 1)
+        roots, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        groups = np.split(np.argsort(inverse, kind='stable'), np.cumsum(np.bincount(inverse))[:-1])
+        leaves = list()
+        for key, ids in zip(roots, groups):
+            node = Node(np.ones(w, dtype=int), key.astype(int), max_bits)
+            index.root[tuple(key)] = node
+            leaves.extend(index._build(node, ids))
+        order = np.concatenate([leaf.ids for leaf in leaves])
+        # writing leaf pages sequentially
+        series = np.lib.format.open_memmap(os.path.join(path, 'series.npy'), mode='w+', dtype=float, shape=(m, n))
+        ordered_words = np.lib.format.open_memmap(os.path.join(path, 'words.npy'), mode='w+',
+                                                  dtype=words.dtype, shape=(m, w))
+        for start in range(0, m, chunk):
+            ids = order[start:start+chunk]
+            # reading the source in ascending order and placing rows back in leaf order
+            ranks = np.argsort(np.argsort(ids))
+            series[start:start+chunk] = np.asarray(source[np.sort(ids)])[ranks]
+            ordered_words[start:start+chunk] = words[ids]
+        series.flush()
+        ordered_words.flush()
+        np.save(os.path.join(path, 'ids.npy'), order)
+        start = 0
+        for leaf in leaves:
+            leaf.extent = (start, start + len(leaf.ids))
+            leaf.ids = None
+            start = leaf.extent[1]
+        index._save_tree(path)
+        del words, series, ordered_words
+        os.remove(os.path.join(path, 'encoded.npy'))
+        return cls.open(path)
+
+    def _save_tree(self, path):
+        """
+        Stores the tree as flat arrays of nodes, children of a node are referenced by their positions
+        :param path:
+        :return:
+        """
+        nodes = list()
+        positions = dict()
+        stack = list(self.root.values())[::-1]
+        while stack:
+            node = stack.pop()
+            positions[id(node)] = len(nodes)
+            nodes.append(node)
+            if not node.is_leaf():
+                stack.extend(node.children[::-1])
+        no_child = (-1, -1)
+        np.savez(os.path.join(path, 'tree.npz'),
+                 shape=(self.n, self.w, self.max_bits, self.threshold),
+                 roots=[positions[id(node)] for node in self.root.values()],
+                 bits=[node.bits for node in nodes],
+                 symbols=[node.symbols for node in nodes],
+                 splits=[-1 if node.is_leaf() else node.split for node in nodes],
+                 children=[no_child if node.is_leaf() else [positions[id(child)] for child in node.children]
+                           for node in nodes],
+                 extents=[node.extent if node.is_leaf() else no_child for node in nodes])
+
+    @classmethod
+    def open(cls, path):
+        """
+        Opens an index created with bulk_load, data files are memory-mapped read-only
+        :param path: index directory
+        :return:
+        """
+        tree = np.load(os.path.join(path, 'tree.npz'))
+        index = cls(*tree['shape'].tolist())
+        index.path = path
+        index.series = np.load(os.path.join(path, 'series.npy'), mmap_mode='r')
+        index.words = np.load(os.path.join(path, 'words.npy'), mmap_mode='r')
+        index.ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+        index.size = index.series.shape[0]
+        bits, symbols = tree['bits'], tree['symbols']
+        nodes = [Node(bits[i], symbols[i], index.max_bits) for i in range(len(bits))]
+        for node, split, children, extent in zip(nodes, tree['splits'], tree['children'], tree['extents']):
+            if split < 0:
+                node.ids, node.extent = None, tuple(extent)
+            else:
+                node.split, node.children = split, (nodes[children[0]], nodes[children[1]])
+        for position in tree['roots']:
+            node = nodes[position]
+            index.root[tuple(node.symbols.tolist())] = node
+        return index
+
+
+def _sorted(best):
+    """
+    Converts a (-distance, id) heap into ids and distances sorted by distance
+    :param best:
+    :return:
+    """
+    best = sorted((-dist, i) for dist, i in best)
+    return np.array([i for _, i in best], dtype=int), np.array([dist for dist, _ in best])
@@ -15,13 +15,14 @@
     limitations under the License.
 """
 import math
+from collections import OrderedDict
+from optparse import OptionParser
 
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-from matplotlib.widgets import SpanSelector, Slider
 
 import matutil as mt
+from pyramid import MinMaxPyramid
+from saxword import SaxWords
 
 __author__ = "Denys Sobchyshak"
 __email__ = "denys.sobchyshak@gmail.com"
@@ -46,20 +47,81 @@ def generate_series(series_length, word_length, sax_cardinality, sym_representat
 
 def compute_transforms(series, word_length, sax_cardinality, sym_representation, freq_principals):
     """
-    Computes PAA, SAX, DFT for provided series
+    Computes PAA, SAX, DFT for provided series. SAX is returned as compact SaxWords.
     :param series:
     :param word_length:
     :param sax_cardinality:
     :param sym_representation:
+        not used, symbols are rendered only at display time
     :param freq_principals:
     :return:
     """
     aggregate = mt.paa(series, word_length)
-    symbolic = mt.sax(series, word_length, sax_cardinality, sym_representation)
-    approximated = np.fft.irfft(np.fft.rfft(series)[:freq_principals], len(series))
+    symbolic = SaxWords.encode(series, word_length, sax_cardinality)
+    approximated = np.fft.irfft(mt.dft(series, freq_principals), len(series))
     return aggregate, symbolic, approximated
 
 
+class TransformCache:
+    """
+    Memoizes transforms of series shown in the explorer, so that moving a slider back and forth or changing a single
+    parameter does not recompute the rest. PAA is keyed by (series id, w), SAX by (series id, w, c) and
+    DFT reconstruction by (series id, d), while the full spectrum of a series is computed once and only truncated.
+    """
+    def __init__(self, size=64):
+        """
+        :param size: maximal number of cached entries, least recently used ones are evicted first
+        """
+        self.size = size
+        self.entries = OrderedDict()
+
+    def _get(self, key, compute):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        else:
+            self.entries[key] = compute()
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return self.entries[key]
+
+    def spectrum(self, series_id, series):
+        """
+        Full real valued DFT of a series
+        :param series_id:
+        :param series:
+        :return:
+        """
+        return self._get(('rfft', series_id), lambda: np.fft.rfft(series))
+
+    def transforms(self, series_id, series, word_length, sax_cardinality, sym_representation, freq_principals):
+        """
+        Cached counterpart of compute_transforms
+        :param series_id: any hashable identifying the series
+        :param series:
+        :param word_length:
+        :param sax_cardinality:
+        :param sym_representation:
+            not used, symbols are rendered only at display time
+        :param freq_principals:
+        :return:
+        """
+        aggregate = self._get(('paa', series_id, word_length), lambda: mt.paa(series, word_length))
+        symbolic = self._get(('sax', series_id, word_length, sax_cardinality),
+                             lambda: SaxWords.encode(series, word_length, sax_cardinality))
+        approximated = self._get(('dft', series_id, freq_principals), lambda: np.fft.irfft(
+            self.spectrum(series_id, series)[:freq_principals], len(series)))
+        return aggregate, symbolic, approximated
+
+    def pyramid(self, key, series):
+        """
+        Level of detail pyramid of a series for plotting
+        :param key: any hashable identifying the series, e.g. ('dft', series id, d)
+        :param series:
+        :return:
+        """
+        return self._get(('pyramid',) + key, lambda: MinMaxPyramid(series))
+
+
 def step_idx(series_length, word_length):
     """
     Calculates indexes for step plot
@@ -73,48 +135,84 @@ def step_idx(series_length, word_length):
 def calculate_sym_frequency(sax_series, sax_cardinality, sym_representation):
     """
     Calculates symbol frequency in provided sax series
-    :param sax_series:
+    :param sax_series: SaxWords
     :param sax_cardinality:
     :param sym_representation:
+        used only to render symbols
     :return:
     """
-    sax_symbols = mt.generate_symbols(sax_cardinality, sym_representation)
-    sym_frequency = [sax_series.count(i) for i in sax_symbols]
-    sym_idx = np.arange(len(sax_symbols))
+    sax_symbols = sax_series.alphabet(sym_representation)
+    sym_frequency = sax_series.frequencies()
+    sym_idx = np.arange(sax_cardinality)
     return sym_idx, sax_symbols, sym_frequency
 
 
+def as_pyramid(series):
+    """
+    Wraps a series into a level of detail pyramid unless it already is one
+    :param series:
+    :return:
+    """
+    return series if isinstance(series, MinMaxPyramid) else MinMaxPyramid(series)
+
+
 def plot_series(series, aggregate, approximation, axis, title, frame=None, enable_legend=False):
     """
     Plots a series with it's step aggregate on provided axis
     :param series:
-        time series
+        time series or its MinMaxPyramid
     :param aggregate:
         PAA series
     :param approximation:
-        DFT reconstruction
+        DFT reconstruction or its MinMaxPyramid
     :param axis:
     :param title:
     :param frame:
     :param enable_legend:
     :return:
+        artists of the series, DFT and PAA to be updated with update_series
     """
-    series_length = len(series)
     axis.cla()
-    axis.plot(series, label='Synthetic series', color='green', linewidth=1.2)
-    axis.plot(approximation, label='DFT', color='red', alpha=0.8, linewidth=1.4)
-    axis.step(step_idx(series_length, len(aggregate)), aggregate, where='post', label='PAA', color='blue', linewidth=1.6)
+    artists = (axis.plot([], [], label='Synthetic series', color='green', linewidth=1.2)[0],
+               axis.plot([], [], label='DFT', color='red', alpha=0.8, linewidth=1.4)[0],
+               axis.step([], [], where='post', label='PAA', color='blue', linewidth=1.6)[0])
+    axis.grid()
+    if enable_legend:
+        axis.legend(loc=2)
+    update_series(artists, series, aggregate, approximation, axis, title, frame)
+    return artists
+
+
+def update_series(artists, series, aggregate, approximation, axis, title, frame=None):
+    """
+    Updates data of artists created by plot_series in place instead of clearing and re-plotting the axis. Long series
+    are drawn from min/max pyramids with about as many points as the axis is wide in pixels, so zooming into a frame
+    pulls finer levels.
+    :param artists:
+    :param series:
+        time series or its MinMaxPyramid
+    :param aggregate:
+    :param approximation:
+        DFT reconstruction or its MinMaxPyramid
+    :param axis:
+    :param title:
+    :param frame:
+    :return:
+    """
+    series, approximation = as_pyramid(series), as_pyramid(approximation)
+    series_length = series.n
     if not frame:
         frame = (0, series_length)
+    pixels = max(int(axis.bbox.width), 1)
+    series_line, approximation_line, aggregate_line = artists
+    idx, values, ymin, ymax = series.render(frame[0], frame[1], pixels)
+    series_line.set_data(idx, values)
+    approximation_line.set_data(*approximation.render(frame[0], frame[1], pixels)[:2])
+    aggregate_line.set_data(step_idx(series_length, len(aggregate)), aggregate)
     axis.set_xlim(*frame)
-    ymax = x[frame[0]:frame[1]].max()
     ymax += abs(ymax*0.1)
-    ymin = x[frame[0]:frame[1]].min()
     ymin -= abs(ymin*0.1)
     axis.set_ylim(ymin, ymax)
-    axis.grid()
-    if enable_legend:
-        axis.legend(loc=2)
     axis.set_title(title)
 
 
@@ -126,45 +224,133 @@ def plot_histogram(sax_series, sax_cardinality, sym_representation, axis):
     :param sym_representation:
     :param axis:
     :return:
+        bars to be updated with update_histogram
     """
     idx, symbols, freq = calculate_sym_frequency(sax_series, sax_cardinality, sym_representation)
     bar_width = 0.9
     axis.cla()
-    axis.barh(idx, freq, bar_width, alpha=0.5, label='Frequency')
-    plt.sca(axis)
-    plt.yticks(idx + bar_width / 2, symbols)
+    bars = axis.barh(idx, freq, bar_width, alpha=0.5, label='Frequency')
+    axis.set_yticks(idx + bar_width / 2)
+    axis.set_yticklabels(symbols)
     axis.set_xlabel('Count of occurrences')
     axis.set_ylabel('Symbol')
     axis.grid()
+    return bars
 
 
-def plot_frequencies(series, axis):
+def update_histogram(bars, sax_series, sax_cardinality, sym_representation, axis):
+    """
+    Updates bar lengths of a histogram created by plot_histogram in place, cardinality has to stay the same
+    :param bars:
+    :param sax_series:
+    :param sax_cardinality:
+    :param sym_representation:
+    :param axis:
+    :return:
+    """
+    _, _, freq = calculate_sym_frequency(sax_series, sax_cardinality, sym_representation)
+    for bar, count in zip(bars, freq):
+        bar.set_width(count)
+    axis.set_xlim(0, max(max(freq), 1) * 1.05)
+
+
+def plot_frequencies(series, axis, spectrum=None):
     """
     Calculate and plot DFT frequency components
     :param series:
     :param axis:
+    :param spectrum: precomputed rfft of the series
     :return:
     """
-    coefficients = 2/n*np.abs(np.fft.rfft(series))
+    if spectrum is None:
+        spectrum = np.fft.rfft(series)
+    coefficients = 2/len(series)*np.abs(spectrum)
     axis.cla()
     axis.plot(coefficients, label='Positive coefficients', alpha=0.8, linewidth=1.6)
     axis.grid()
 
 
+def load_series(path):
+    """
+    Loads a series from a .npy file or a text file with one value per line
+    :param path:
+    :return:
+    """
+    if path.endswith('.npy'):
+        return np.load(path)
+    return np.loadtxt(path)
+
+
+def report_transforms(series, aggregate, symbolic, approximated, sym_representation):
+    """
+    Summarizes transforms of a series as text, used in headless mode
+    :param series:
+    :param aggregate:
+    :param symbolic:
+    :param approximated:
+    :param sym_representation:
+    :return:
+    """
+    step = len(series) / len(aggregate)
+    reconstructed = aggregate[np.minimum((np.arange(len(series)) / step).astype(int), len(aggregate) - 1)]
+    lines = ['series length={} word length={} cardinality={}'.format(len(series), len(aggregate), symbolic.c),
+             'SAX: {}'.format(' '.join(symbolic.symbols(sym_representation)[0])),
+             'PAA reconstruction distance: {:.4f}'.format(mt.distance(series, reconstructed)),
+             'DFT reconstruction distance: {:.4f}'.format(mt.distance(series, approximated))]
+    return '\n'.join(lines)
+
+
+def get_cli_parser():
+    """
+    Options of the explorer, numeric options also set initial slider values
+    :return:
+    """
+    parser = OptionParser('usage: %prog [options]')
+    parser.add_option('-n', '--length', dest='n', type='int', default=2000, help='series length')
+    parser.add_option('-w', '--word', dest='w', type='int', default=250, help='word length')
+    parser.add_option('-c', '--cardinality', dest='c', type='int', default=30, help='SAX cardinality')
+    parser.add_option('-d', '--dft', dest='d', type='int', default=120, help='number of DFT components')
+    parser.add_option('-r', '--representation', dest='representation', default='binary',
+                      help='symbol representation: binary, letter, integer')
+    parser.add_option('-f', '--file', dest='filename', default=None,
+                      help='series to transform (.npy or one value per line) instead of a random walk')
+    parser.add_option('--seed', dest='seed', type='int', default=None, help='random walk seed')
+    parser.add_option('--headless', dest='headless', action='store_true', default=False,
+                      help='print transforms without starting the plotting UI')
+    return parser
+
+
 if __name__ == '__main__':
-    # hacking tight layout warning
-    import warnings
-    warnings.filterwarnings("ignore")
+    opts, _ = get_cli_parser().parse_args()
 
     # initial parameters
-    n = 2000
-    w = 250
-    c = 30
-    d = 120
-    representation = 'binary'
+    n = opts.n
+    w = opts.w
+    c = opts.c
+    d = opts.d
+    representation = opts.representation
 
     # transform
-    x, paa, sax, dft = generate_series(n, w, c, representation, d)
+    cache = TransformCache()
+    series_id = 0
+    if opts.seed is not None:
+        np.random.seed(opts.seed)
+    x = mt.normalize(load_series(opts.filename) if opts.filename else mt.random_walk(n))
+    n = len(x)
+    paa, sax, dft = cache.transforms(series_id, x, w, c, representation, d)
+
+    if opts.headless:
+        print(report_transforms(x, paa, sax, dft, representation))
+        exit()
+
+    # plotting stack is only needed by the UI
+    import matplotlib.pyplot as plt
+    import matplotlib.gridspec as gridspec
+    from matplotlib.widgets import SpanSelector, Slider
+
+    # hacking tight layout warning
+    import warnings
+    warnings.filterwarnings("ignore")
 
     # transform showcase
     # x1 = mt.normalize(np.array([-1.80089787, -2.08520023, -1.91626555, -3.54447247, -3.33739674]))
@@ -193,27 +379,30 @@ if __name__ == '__main__':
     ax4 = plt.subplot(gs[-4:-2, -1])
 
     # plotting complete time series
-    plot_series(x, paa, dft, ax1, 'Complete series (t={}, w={}, freq={})'.format(n, w, d), enable_legend=True)
+    x_lod, dft_lod = cache.pyramid(('series', series_id), x), cache.pyramid(('dft', series_id, d), dft)
+    complete = plot_series(x_lod, paa, dft_lod, ax1, 'Complete series (t={}, w={}, freq={})'.format(n, w, d),
+                           enable_legend=True)
 
     # plotting windowed slice
     xmin = math.floor(n / 2)
     xmax = math.ceil(n / 2 + n / 10)
-    plot_series(x, paa, dft, ax2, 'Selected window x=[{},{}]'.format(xmin, xmax), frame=(xmin, xmax))
+    window = plot_series(x_lod, paa, dft_lod, ax2, 'Selected window x=[{},{}]'.format(xmin, xmax), frame=(xmin, xmax))
 
     # adding span selector
     def onselect(xmin, xmax):
         idx_min = math.floor(xmin)
         idx_max = math.ceil(xmax)
-        plot_series(x, paa, dft, ax2, 'Selected window x=[{},{}]'.format(idx_min, idx_max), frame=(idx_min, idx_max))
-        fig.canvas.draw()
+        update_series(window, x_lod, paa, dft_lod, ax2, 'Selected window x=[{},{}]'.format(idx_min, idx_max),
+                      frame=(idx_min, idx_max))
+        fig.canvas.draw_idle()
     span_selector = SpanSelector(ax1, onselect, 'horizontal', useblit=True,
-                                 rectprops=dict(alpha=0.2, facecolor='magenta'))
+                                 props=dict(alpha=0.2, facecolor='magenta'))
 
     # plotting symbol frequency count
-    plot_histogram(sax, c, representation, ax3)
+    histogram = plot_histogram(sax, c, representation, ax3)
 
     # plotting DFT frequency coefficients
-    plot_frequencies(x, ax4)
+    plot_frequencies(x, ax4, cache.spectrum(series_id, x))
 
     # plotting parameter sliders
     series_length_slider = Slider(plt.axes([0.76, 0.18, 0.19, 0.02]), 'Series Length',
@@ -226,23 +415,32 @@ if __name__ == '__main__':
                                 valmin=10, valmax=200, valinit=d, valfmt='%d')
 
     def update(val):
-        global n, w, c, d, x, paa, sax, dft
+        global n, w, c, d, x, paa, sax, dft, series_id, histogram, x_lod, dft_lod
         n_new = int(series_length_slider.val)
-        w = int(word_length_slider.val)
-        c = int(cardinality_slider.val)
-        d = int(frequency_primes_slider.val)
+        w_new = int(word_length_slider.val)
+        c_new = int(cardinality_slider.val)
+        d_new = int(frequency_primes_slider.val)
+        if (n_new, w_new, c_new, d_new) == (n, w, c, d):
+            return
         if n != n_new:
-            n = n_new
-            x, paa, sax, dft = generate_series(n, w, c, representation, d)
-        else:
-            paa, sax, dft = compute_transforms(x, w, c, representation, d)
+            series_id += 1
+            x = mt.normalize(mt.random_walk(n_new))
+            plot_frequencies(x, ax4, cache.spectrum(series_id, x))
+        cardinality_changed, histogram_changed = c != c_new, (n, w) != (n_new, w_new)
+        n, w, c, d = n_new, w_new, c_new, d_new
+        paa, sax, dft = cache.transforms(series_id, x, w, c, representation, d)
+        x_lod, dft_lod = cache.pyramid(('series', series_id), x), cache.pyramid(('dft', series_id, d), dft)
         # update series plot
-        plot_series(x, paa, dft, ax1, 'Complete series (t={}, w={}, freq={})'.format(n, w, d), enable_legend=True)
+        update_series(complete, x_lod, paa, dft_lod, ax1, 'Complete series (t={}, w={}, freq={})'.format(n, w, d))
         xmin, xmax = ax2.get_xlim()
         xmin, xmax = int(xmin), int(xmax)
-        plot_series(x, paa, dft, ax2, 'Selected window x=[{},{}]'.format(xmin, xmax), frame=(xmin, xmax))
+        update_series(window, x_lod, paa, dft_lod, ax2, 'Selected window x=[{},{}]'.format(xmin, xmax),
+                      frame=(xmin, xmax))
         # update frequency plot
-        plot_histogram(sax, c, representation, ax3)
+        if cardinality_changed:
+            histogram = plot_histogram(sax, c, representation, ax3)
+        elif histogram_changed:
+            update_histogram(histogram, sax, c, representation, ax3)
         fig.canvas.draw_idle()
     series_length_slider.on_changed(update)
     word_length_slider.on_changed(update)
@@ -14,25 +14,37 @@
     See the License for the specific language governing permissions and
     limitations under the License.
 """
+import functools
 import math
 import string
+import types
 
 import numpy as np
-import scipy.stats as stat
 
 __author__ = "Denys Sobchyshak"
 __email__ = "denys.sobchyshak@gmail.com"
 
+# number of cardinalities (or cardinality and representation pairs) kept by every cache
+CACHE_SIZE = 64
 
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def qnorm(n=3):
     """
     Generates quantile values of N(0, 1) for provided number of splits, e.g. for four splits it will generate an
-    array [-0.67448975,  0,  0.67448975]
+    array [-0.67448975,  0,  0.67448975]. Results are cached and read-only.
     :param n:
     :return:
     """
     if n > 1:
-        return stat.norm.ppf(np.linspace(0, 1, n+1)[1:-1])
+        # scipy.stats takes longer to import than the rest of the module, so it is loaded on first use
+        import scipy.stats as stat
+        return _read_only(stat.norm.ppf(np.linspace(0, 1, n+1)[1:-1]))
 
 
 def random_walk(n=1000):
@@ -58,13 +70,13 @@ def distance(s1, s2, metric='euclidean'):
     """
     Computes distance measure for provided metric parameter
     :param s1:
-    :param s2:
+    :param s2: series or a matrix of series (series x length), in which case a vector of distances is returned
     :param metric: euclidean
     :return:
         distance between two time series according to specified metric
     """
     if metric == 'euclidean':
-        return math.sqrt(((s1-s2)**2).sum())
+        return np.sqrt(((s1-s2)**2).sum(axis=-1))
 
 
 def sax_dist(sym1, sym2, symbols, breakpoints):
@@ -84,6 +96,26 @@ def sax_dist(sym1, sym2, symbols, breakpoints):
         return breakpoints[max(idx1, idx2)-1] - breakpoints[min(idx1, idx2)]
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def mindist_table(c=256, squared=False):
+    """
+    Builds a c x c lookup table of distances between SAX symbol indexes, see sax_dist. Tables are cached per
+    cardinality and returned read-only.
+    :param c: cardinality
+    :param squared: build a table of squared distances
+    :return:
+    """
+    if squared:
+        return _read_only(mindist_table(c)**2)
+    table = np.zeros((c, c))
+    if c > 2:
+        breakpoints = qnorm(c)
+        i, j = np.indices((c, c))
+        far = np.abs(i - j) > 1
+        table[far] = breakpoints[np.maximum(i, j)[far] - 1] - breakpoints[np.minimum(i, j)[far]]
+    return _read_only(table)
+
+
 def mindist(n, s1, s2, cardinality=256, representation='binary'):
     """
     Calculate distance between two sax series
@@ -97,10 +129,127 @@ def mindist(n, s1, s2, cardinality=256, representation='binary'):
     """
     w1, w2 = len(s1), len(s2)
     if w1 == w2:
-        symbols = generate_symbols(cardinality, representation)
-        breakpoints = qnorm(cardinality)
-        distances = [sax_dist(s1[i], s2[i], symbols, breakpoints) for i in range(w1)]
-        return math.sqrt(n/w1)*math.sqrt((np.asarray(distances)**2).sum())
+        indexes = symbol_indexes(cardinality, representation)
+        idx1 = np.fromiter((indexes[symbol] for symbol in s1), dtype=int, count=w1)
+        idx2 = np.fromiter((indexes[symbol] for symbol in s2), dtype=int, count=w2)
+        return math.sqrt(n/w1)*math.sqrt((mindist_table(cardinality)[idx1, idx2]**2).sum())
+
+
+def mindist_words(n, words1, words2, c=256):
+    """
+    Calculate lower bounding distances between integer encoded sax words, e.g. as returned by sax_batch. Either argument
+    can be a single word or a matrix of words, so one-vs-one, one-vs-many and many-vs-many distances are supported.
+    :param n: length of original series
+    :param words1: word (w) or matrix of words (m1 x w)
+    :param words2: word (w) or matrix of words (m2 x w)
+    :param c: cardinality
+    :return:
+        None if words are of different length, distance (scalar, m1 or m2 vector, m1 x m2 matrix) otherwise
+    """
+    words1, words2 = np.asarray(words1), np.asarray(words2)
+    w = words1.shape[-1]
+    if w == words2.shape[-1]:
+        squared = mindist_table(c, squared=True)
+        if words1.ndim > 1 and words2.ndim > 1:
+            # accumulate segment by segment, so that memory stays m1 x m2 instead of m1 x m2 x w
+            total = np.zeros((len(words1), len(words2)))
+            for j in range(w):
+                total += squared[words1[:, j, np.newaxis], words2[np.newaxis, :, j]]
+        else:
+            total = squared[words1, words2].sum(axis=-1)
+        return np.sqrt(n/w * total)
+
+
+def mindist_paa(n, aggregate, lower, upper):
+    """
+    Calculate lower bounding distance between a PAA of a series and SAX regions, i.e. intervals of N(0, 1) that
+    symbols of a word stand for. Regions may come from symbols of different cardinality, as in iSAX.
+    :param n: length of original series
+    :param aggregate: PAA of the series
+    :param lower: lower breakpoints of the regions, -inf for the first symbol, or a matrix of those for many words
+    :param upper: upper breakpoints of the regions, inf for the last symbol, or a matrix of those for many words
+    :return:
+    """
+    gaps = np.maximum(lower - aggregate, 0) + np.maximum(aggregate - upper, 0)
+    return np.sqrt(n/len(aggregate) * (gaps**2).sum(axis=-1))
+
+
+def dft(series, d):
+    """
+    Computes first d coefficients of a real valued discrete Fourier transform of a series or of every row of a matrix
+    of series
+    :param series:
+    :param d: number of coefficients
+    :return:
+    """
+    return np.fft.rfft(series, axis=-1)[..., :d]
+
+
+def dft_weights(n, d):
+    """
+    Weights of squared coefficient differences that turn truncated DFT distance into a lower bound of euclidean
+    distance (Parseval's theorem). Every coefficient but the constant and the Nyquist one stands for a conjugate pair.
+    :param n: length of original series
+    :param d: number of coefficients
+    :return:
+    """
+    weights = np.full(min(d, n//2 + 1), 2.0 / n)
+    weights[0] = 1.0 / n
+    if n % 2 == 0 and len(weights) == n//2 + 1:
+        weights[-1] = 1.0 / n
+    return weights
+
+
+def dft_distance(n, coefficients1, coefficients2):
+    """
+    Calculate lower bounding distances between truncated DFT coefficients of series of length n. Either argument can
+    be coefficients of a single series or a matrix of those, as in mindist_words.
+    :param n: length of original series
+    :param coefficients1: coefficients (d) or matrix of coefficients (m1 x d)
+    :param coefficients2: coefficients (d) or matrix of coefficients (m2 x d)
+    :return:
+        None if coefficients are of different length, distance (scalar, vector or m1 x m2 matrix) otherwise
+    """
+    coefficients1, coefficients2 = np.asarray(coefficients1), np.asarray(coefficients2)
+    d = coefficients1.shape[-1]
+    if d == coefficients2.shape[-1]:
+        weights = dft_weights(n, d)
+        if coefficients1.ndim > 1 and coefficients2.ndim > 1:
+            # accumulate coefficient by coefficient, so that memory stays m1 x m2 instead of m1 x m2 x d
+            total = np.zeros((len(coefficients1), len(coefficients2)))
+            for j in range(len(weights)):
+                total += weights[j] * np.abs(coefficients1[:, j, np.newaxis] - coefficients2[np.newaxis, :, j])**2
+            return np.sqrt(total)
+        squared = np.abs(coefficients1 - coefficients2)**2
+        return np.sqrt((squared * weights).sum(axis=-1))
+
+
+def knn_search(query, matrix, bounds, k=1, batch=64):
+    """
+    Finds k nearest neighbours of a query among rows of a matrix, computing true distances only for candidates whose
+    lower bound (e.g. mindist_words or dft_distance) is smaller than the current k-th distance
+    :param query:
+    :param matrix: series (series x length)
+    :param bounds: lower bounds of distances between the query and every series
+    :param k:
+    :param batch: number of candidates checked at once
+    :return:
+        ids and distances of found series sorted by distance, number of computed true distances
+    """
+    order = np.argsort(bounds, kind='stable')
+    ids = np.empty(0, dtype=int)
+    distances = np.empty(0)
+    start = 0
+    while start < len(order):
+        if len(ids) == k and bounds[order[start]] >= distances[-1]:
+            break
+        candidates = order[start:start+batch]
+        ids = np.concatenate((ids, candidates))
+        distances = np.concatenate((distances, distance(query, matrix[candidates])))
+        best = np.argsort(distances, kind='stable')[:k]
+        ids, distances = ids[best], distances[best]
+        start += batch
+    return ids, distances, min(start, len(order))
 
 
 def find_symbol(value, breakpoints, symbols):
@@ -116,24 +265,52 @@ def find_symbol(value, breakpoints, symbols):
     else:
         for i in range(breakpoints.shape[0]):
             if value <= breakpoints[i]:
-                return symbols[i+1]
+                return symbols[i]
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def generate_symbols(n, representation='binary'):
     """
     Generates n symbols in provided representation. Will not return more than 26 symbols for 'letter' representation.
-    Available representations: binary, letter, integer
+    Available representations: binary, letter, integer. Results are cached, hence returned as tuples.
     :param n:
     :param representation: binary, letter, integer
     :return:
         None, if unknown representation
     """
     if representation == 'binary':
-        return ['{:0>{width}b}'.format(i, width=math.ceil(math.log2(n))) for i in range(n)]
+        return tuple('{:0>{width}b}'.format(i, width=math.ceil(math.log2(n))) for i in range(n))
     elif representation == 'letter':
-        return list(string.ascii_lowercase)[:n]
+        return tuple(string.ascii_lowercase[:n])
     elif representation == 'integer':
-        return [str(i) for i in range(n)]
+        return tuple(str(i) for i in range(n))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def symbol_indexes(n, representation='binary'):
+    """
+    Read-only mapping of symbols generated by generate_symbols to their indexes
+    :param n:
+    :param representation: binary, letter, integer
+    :return:
+    """
+    return types.MappingProxyType({symbol: i for i, symbol in enumerate(generate_symbols(n, representation))})
+
+
+def warm_cache(cardinalities, representations=('binary', 'letter', 'integer')):
+    """
+    Precomputes cached breakpoints, alphabets and distance tables, e.g. at startup or in a worker pool initializer.
+    Processes forked afterwards share the cached read-only arrays.
+    :param cardinalities:
+    :param representations: binary, letter, integer
+    :return:
+    """
+    for c in cardinalities:
+        qnorm(c)
+        mindist_table(c)
+        mindist_table(c, squared=True)
+        for representation in representations:
+            symbol_indexes(c, representation)
 
 
 def sax(series, w, c=256, representation='letter'):
@@ -159,25 +336,67 @@ def sax(series, w, c=256, representation='letter'):
     return symbolic
 
 
+def symbol_dtype(c):
+    """
+    Picks the smallest unsigned integer type able to hold symbol indexes of provided cardinality
+    :param c: cardinality
+    :return:
+    """
+    return np.uint8 if c <= 256 else np.uint16 if c <= 65536 else np.uint32
+
+
+def sax_batch(matrix, w, c=256, representation=None):
+    """
+    Transforms every row of provided matrix into SAX at once. Rows are expected to be normalized. Symbols are encoded as
+    integer indexes of the N(0, 1) intervals, which are looked up with a binary search over the breakpoints.
+    :param matrix: 2-D array of series (series x length)
+    :param w: word length
+    :param c: cardinality
+    :param representation: None for integer indexes or binary, letter, integer for string symbols
+    :return:
+        matrix of symbols (series x w), None if word length is invalid
+    """
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+    m, n = matrix.shape
+    if w < 1 or n < w:
+        return None
+    aggregate = paa(matrix, w)
+    if c > 1:
+        codes = np.searchsorted(qnorm(c), aggregate, side='left').astype(symbol_dtype(c))
+    else:
+        codes = np.zeros(aggregate.shape, dtype=symbol_dtype(c))
+    if representation is None:
+        return codes
+    if representation == 'letter' and c > 26:
+        representation = 'binary'
+    return np.asarray(generate_symbols(c, representation))[codes]
+
+
 def paa(series, w):
     """
-    Transforms provided series into a Piecewise Aggregate Approximation (PAA) representation
+    Transforms provided series into a Piecewise Aggregate Approximation (PAA) representation. Accepts a single series or
+    a stack of series (series x length), in which case every row is transformed. Segment means are computed from
+    cumulative sums, points shared by two segments contribute to both proportionally, so memory stays linear in series
+    length.
     :param series:
     :param w:
         word length or size of the transform with 0 < w <= len(series)
     :return:
         None if w < 1 or len(series) < w, PAA otherwise
     """
-    n = len(series)
-    series = np.array(series)
+    series = np.asarray(series, dtype=float)
+    n = series.shape[-1]
     if n == w:
         return series
-    if w == 1:
-        return [series.mean()]
     if w < 1 or n < w:
         return None
-    aggregate = [0]*w
-    idx = np.arange(n*w) // w
-    for i in range(0, n*w, n):
-        aggregate[i//n] = series[idx[i:i+n]].sum() / n
-    return aggregate
+    if n % w == 0:
+        return series.reshape(series.shape[:-1] + (w, n // w)).mean(axis=-1)
+    # boundaries of segments in units of 1/w of a point
+    bounds = np.arange(w + 1) * n
+    idx, rem = bounds // w, bounds % w
+    cumulative = np.zeros(series.shape[:-1] + (n + 1,))
+    np.cumsum(series, axis=-1, out=cumulative[..., 1:])
+    # the last boundary has no remainder, so clipping its index does not change the result
+    integral = w * cumulative[..., idx] + rem * series[..., np.minimum(idx, n - 1)]
+    return np.diff(integral, axis=-1) / n
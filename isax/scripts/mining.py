@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import itertools
+
+import numpy as np
+
+import matutil as mt
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+class Subsequences:
+    """
+    Normalized sliding windows of a long series. Windows are a strided view of the series, their means and standard
+    deviations come from cumulative sums, so a window is normalized only when it is actually compared.
+    """
+    def __init__(self, series, n, eps=1e-8):
+        """
+        :param series:
+        :param n: window length
+        :param eps: windows with smaller standard deviation are treated as flat
+        """
+        series = np.asarray(series, dtype=float)
+        self.n = n
+        self.windows = np.lib.stride_tricks.sliding_window_view(series, n)
+        self.m = self.windows.shape[0]
+        sums = np.concatenate(([0], np.cumsum(series)))
+        squares = np.concatenate(([0], np.cumsum(series**2)))
+        self.mean = (sums[n:] - sums[:-n]) / n
+        std = np.sqrt(np.maximum((squares[n:] - squares[:-n]) / n - self.mean**2, 0))
+        # flat windows normalize to zeros
+        self.scale = np.where(std < eps, np.inf, std)
+
+    def normalized(self, ids):
+        """
+        Normalized windows starting at provided positions
+        :param ids: position or array of positions
+        :return:
+        """
+        return (self.windows[ids] - self.mean[ids, np.newaxis]) / self.scale[ids, np.newaxis]
+
+    def distance(self, i, ids):
+        """
+        Euclidean distances between normalized window i and windows starting at ids
+        :param i:
+        :param ids:
+        :return:
+        """
+        return mt.distance(self.normalized([i])[0], self.normalized(ids))
+
+    def sax(self, w, c, chunk=65536):
+        """
+        Encodes every window into SAX, chunk by chunk
+        :param w: word length
+        :param c: cardinality
+        :param chunk: number of windows normalized at once
+        :return:
+            matrix of integer encoded words
+        """
+        words = np.empty((self.m, w), dtype=mt.symbol_dtype(c))
+        for start in range(0, self.m, chunk):
+            words[start:start+chunk] = mt.sax_batch(self.normalized(np.arange(start, min(start + chunk, self.m))), w, c)
+        return words
+
+
+def buckets(words):
+    """
+    Groups equal words together
+    :param words: matrix of integer encoded words
+    :return:
+        bucket number of every word and positions of words grouped by buckets
+    """
+    _, inverse, counts = np.unique(words, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    groups = np.split(np.argsort(inverse, kind='stable'), np.cumsum(counts)[:-1])
+    return inverse, groups
+
+
+def motifs(series, n, w=8, c=4, k=1, projections=10, masked=2, max_bucket=256, candidates=100000, chunk=4096, seed=0):
+    """
+    Finds top k motifs, i.e. closest pairs of non-overlapping subsequences, using random projections of SAX words.
+    Every projection masks a few segments of the words and hashes the rest, pairs of windows that often collide are
+    compared with true euclidean distance in order of their collision counts.
+    :param series:
+    :param n: subsequence length
+    :param w: word length
+    :param c: cardinality
+    :param k: number of motifs
+    :param projections: number of random projections
+    :param masked: number of segments masked in every projection
+    :param max_bucket: buckets larger than that are sampled down, so that a flat region does not produce a quadratic
+        number of pairs
+    :param candidates: maximal number of candidate pairs compared with true distance
+    :param chunk: number of pairs compared at once
+    :param seed:
+    :return:
+        list of (position, position, distance) sorted by distance
+    """
+    subsequences = Subsequences(series, n)
+    words = subsequences.sax(w, c)
+    state = np.random.RandomState(seed)
+    m = subsequences.m
+    collisions = list()
+    for _ in range(projections):
+        kept = np.sort(state.choice(w, w - masked, replace=False))
+        for group in buckets(words[:, kept])[1]:
+            if len(group) < 2:
+                continue
+            if len(group) > max_bucket:
+                group = np.sort(state.choice(group, max_bucket, replace=False))
+            first, second = np.triu_indices(len(group), 1)
+            first, second = group[first], group[second]
+            # overlapping windows are trivial matches
+            valid = second - first >= n
+            collisions.append(first[valid].astype(np.int64) * m + second[valid])
+    if not collisions:
+        return list()
+    codes, counts = np.unique(np.concatenate(collisions), return_counts=True)
+    codes = codes[np.argsort(-counts, kind='stable')[:candidates]]
+    if not len(codes):
+        return list()
+    pairs = np.column_stack((codes // m, codes % m))
+    distances = np.concatenate([mt.distance(subsequences.normalized(block[:, 0]), subsequences.normalized(block[:, 1]))
+                                for block in np.array_split(pairs, range(chunk, len(pairs), chunk))])
+    found = list()
+    for idx in np.argsort(distances, kind='stable'):
+        i, j = pairs[idx]
+        if all(abs(i - p) >= n and abs(j - p) >= n and abs(i - q) >= n and abs(j - q) >= n for p, q, _ in found):
+            found.append((int(i), int(j), float(distances[idx])))
+            if len(found) == k:
+                break
+    return found
+
+
+def discords(series, n, w=8, c=4, k=1, batch=256, seed=0):
+    """
+    Finds top k discords, i.e. subsequences with the largest distance to their nearest non-overlapping neighbour, with
+    the HOT SAX heuristic. Windows with rare words are checked first, their neighbours are searched first within the
+    same bucket, so that the search for a neighbour is abandoned as soon as it finds one closer than the best discord.
+    :param series:
+    :param n: subsequence length
+    :param w: word length
+    :param c: cardinality
+    :param k: number of discords
+    :param batch: number of neighbours compared at once
+    :param seed:
+    :return:
+        list of (position, nearest neighbour distance) sorted by distance in descending order
+    """
+    subsequences = Subsequences(series, n)
+    m = subsequences.m
+    inverse, groups = buckets(subsequences.sax(w, c))
+    sizes = np.array([len(group) for group in groups])
+    state = np.random.RandomState(seed)
+    outer = np.lexsort((state.permutation(m), sizes[inverse]))
+    inner = state.permutation(m)
+    found = list()
+    excluded = np.zeros(m, dtype=bool)
+    for _ in range(k):
+        best, best_distance = None, 0.0
+        for i in outer:
+            if excluded[i]:
+                continue
+            nearest = np.inf
+            candidates = itertools.chain([groups[inverse[i]]], (inner[s:s+batch] for s in range(0, m, batch)))
+            for neighbours in candidates:
+                neighbours = neighbours[np.abs(neighbours - i) >= n]
+                if len(neighbours):
+                    nearest = min(nearest, subsequences.distance(i, neighbours).min())
+                if nearest < best_distance:
+                    break
+            if best_distance < nearest < np.inf:
+                best, best_distance = i, nearest
+        if best is None:
+            break
+        found.append((int(best), float(best_distance)))
+        excluded[max(0, best - n + 1):best + n] = True
+    return found
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import matutil as mt
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+def output_spec(transform, n, w, c, d):
+    """
+    Width and type of a row of transformed data
+    :param transform: sax, paa or dft
+    :param n: series length
+    :param w: word length
+    :param c: cardinality
+    :param d: number of DFT coefficients
+    :return:
+        None if transform is unknown
+    """
+    if transform == 'sax':
+        return w, mt.symbol_dtype(c)
+    elif transform == 'paa':
+        return w, np.float64
+    elif transform == 'dft':
+        return min(d, n // 2 + 1), np.complex128
+
+
+def transform_block(block, transform, w, c, d):
+    """
+    Applies a transform to a block of series (series x n)
+    :param block:
+    :param transform: sax, paa or dft
+    :param w: word length
+    :param c: cardinality
+    :param d: number of DFT coefficients
+    :return:
+    """
+    if transform == 'sax':
+        return mt.sax_batch(block, w, c)
+    elif transform == 'paa':
+        return mt.paa(block, w)
+    elif transform == 'dft':
+        return mt.dft(block, d)
+
+
+def _attach(spec):
+    """
+    Maps an array described by spec without copying it. Spec is either ('shm', name, shape, dtype) for shared memory
+    or ('memmap', filename, offset, shape, dtype) for memory-mapped files.
+    :param spec:
+    :return:
+        array and shared memory handle that has to stay open while the array is used (None for memmaps)
+    """
+    if spec[0] == 'shm':
+        _, name, shape, dtype = spec
+        handle = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, dtype=dtype, buffer=handle.buf), handle
+    _, filename, offset, shape, dtype = spec
+    return np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape), None
+
+
+def _encode_shard(source, target, start, end, transform, w, c, d):
+    """
+    Process pool worker, transforms rows [start, end) of the source array into the target array
+    :return:
+    """
+    matrix, source_handle = _attach(source)
+    result, target_handle = _attach(target)
+    result[start:end] = transform_block(matrix[start:end], transform, w, c, d)
+    del matrix, result
+    for handle in (source_handle, target_handle):
+        if handle is not None:
+            handle.close()
+
+
+def _share(matrix):
+    """
+    Describes a matrix so that workers can map it. Memory-mapped files are shared by name, any other array is copied
+    into shared memory once.
+    :param matrix:
+    :return:
+        spec and shared memory handle to be released by the caller (None for memmaps)
+    """
+    # only memmaps that map a file directly, slices of them carry a stale offset
+    if isinstance(matrix, np.memmap) and isinstance(matrix.base, mmap.mmap) and matrix.flags.c_contiguous:
+        return ('memmap', matrix.filename, matrix.offset, matrix.shape, matrix.dtype.str), None
+    matrix = np.ascontiguousarray(matrix, dtype=float)
+    handle = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=handle.buf)[:] = matrix
+    return ('shm', handle.name, matrix.shape, matrix.dtype.str), handle
+
+
+def encode(matrix, w=None, c=256, transform='sax', d=None, workers=None, pool='process', shard=None):
+    """
+    Transforms a collection of series (series x n) in parallel. Rows are split into shards which workers read from
+    shared memory or the memory-mapped source and write into a single shared result, so large arrays are never
+    pickled.
+    :param matrix: array or np.memmap of normalized series
+    :param w: word length for sax and paa
+    :param c: cardinality for sax
+    :param transform: sax, paa or dft
+    :param d: number of DFT coefficients for dft
+    :param workers: number of workers, defaults to the number of cores
+    :param pool: process or thread
+    :param shard: number of series per task, defaults to an even split between workers
+    :return:
+        contiguous matrix of symbols, PAA or DFT coefficients, None if transform is unknown
+    """
+    m, n = matrix.shape
+    spec = output_spec(transform, n, w, c, d)
+    if spec is None:
+        return None
+    width, dtype = spec
+    workers = workers or os.cpu_count() or 1
+    shard = shard or max(1, -(-m // workers))
+    bounds = [(start, min(start + shard, m)) for start in range(0, m, shard)]
+    if pool == 'thread':
+        result = np.empty((m, width), dtype=dtype)
+        with ThreadPoolExecutor(workers) as executor:
+            def work(start, end):
+                result[start:end] = transform_block(np.asarray(matrix[start:end], dtype=float), transform, w, c, d)
+            list(executor.map(lambda bound: work(*bound), bounds))
+        return result
+    source, source_handle = _share(matrix)
+    target_handle = shared_memory.SharedMemory(create=True, size=max(m * width * np.dtype(dtype).itemsize, 1))
+    target = ('shm', target_handle.name, (m, width), np.dtype(dtype).str)
+    try:
+        with ProcessPoolExecutor(workers, initializer=mt.warm_cache, initargs=([c], ())) as executor:
+            futures = [executor.submit(_encode_shard, source, target, start, end, transform, w, c, d)
+                       for start, end in bounds]
+            for future in futures:
+                future.result()
+        return np.ndarray((m, width), dtype=dtype, buffer=target_handle.buf).copy()
+    finally:
+        for handle in (source_handle, target_handle):
+            if handle is not None:
+                handle.close()
+                handle.unlink()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import math
+
+import numpy as np
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution representation of a long series for plotting. Level k keeps minimum and maximum of every block of
+    2**k points, so a frame can be drawn with about as many points as there are pixels without losing peaks. All levels
+    together take as much memory as the series itself.
+    """
+    def __init__(self, series):
+        """
+        :param series:
+        """
+        series = np.asarray(series, dtype=float)
+        self.n = len(series)
+        self.levels = [(series, series)]
+        mins, maxs = series, series
+        while len(mins) > 1:
+            if len(mins) % 2:
+                mins, maxs = np.append(mins, mins[-1]), np.append(maxs, maxs[-1])
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            self.levels.append((mins, maxs))
+
+    def level(self, start, end, pixels):
+        """
+        Picks the coarsest level that still has at least one block per pixel in the frame
+        :param start:
+        :param end:
+        :param pixels:
+        :return:
+        """
+        span = max(end - start, 1)
+        if span <= 2 * pixels:
+            return 0
+        return min(int(math.log2(span / pixels)), len(self.levels) - 1)
+
+    def render(self, start=0, end=None, pixels=1000):
+        """
+        Points to be plotted for a frame of the series
+        :param start: first index of the frame
+        :param end: index past the end of the frame, defaults to series length
+        :param pixels: horizontal resolution of the plot
+        :return:
+            x values, y values, minimum and maximum within the frame
+        """
+        end = self.n if end is None else end
+        start, end = max(int(start), 0), min(int(math.ceil(end)), self.n)
+        if end <= start:
+            return np.empty(0), np.empty(0), 0.0, 0.0
+        k = self.level(start, end, pixels)
+        mins, maxs = self.levels[k]
+        if k == 0:
+            values = mins[start:end]
+            return np.arange(start, end), values, values.min(), values.max()
+        block = 2**k
+        first, last = start // block, -(-end // block)
+        mins, maxs = mins[first:last], maxs[first:last]
+        centers = np.arange(first, last) * block + (block - 1) / 2
+        xs = np.repeat(centers, 2)
+        ys = np.empty(2 * len(mins))
+        ys[0::2], ys[1::2] = mins, maxs
+        return xs, ys, mins.min(), maxs.max()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import numpy as np
+
+import matutil as mt
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+class SaxStream:
+    """
+    Sliding window SAX encoder. Keeps prefix sums of samples and their squares, so that window mean, standard deviation
+    and segment means are updated in O(w) per sample instead of normalizing and aggregating every window from scratch.
+    Prefix sums are rebuilt from the window every n samples, which keeps them from drifting on long streams.
+    """
+    def __init__(self, n, w, c=256, numerosity_reduction=False, eps=1e-8):
+        """
+        :param n: window length
+        :param w: word length, 0 < w <= n
+        :param c: cardinality
+        :param numerosity_reduction: emit a word only if it differs from the previously emitted one
+        :param eps: windows with smaller standard deviation are treated as flat and encoded as zero PAA
+        """
+        self.n = n
+        self.w = w
+        self.c = c
+        self.numerosity_reduction = numerosity_reduction
+        self.eps = eps
+        self.breakpoints = mt.qnorm(c) if c > 1 else np.empty(0)
+        self.dtype = mt.symbol_dtype(c)
+        # segment boundaries in units of 1/w of a sample, see matutil.paa
+        bounds = np.arange(w + 1) * n
+        self.idx, self.rem = bounds // w, bounds % w
+        self.clipped = np.minimum(self.idx, n - 1)
+        self.values = np.zeros(2*n)
+        self.prefix = np.zeros(2*n + 1)
+        self.squares = np.zeros(2*n + 1)
+        self.end = 0
+        self.count = 0
+        self.last = None
+
+    def _rebase(self):
+        """
+        Moves the last n - 1 samples to the beginning of the buffers and recomputes prefix sums from them
+        :return:
+        """
+        kept = self.values[self.end - self.n + 1:self.end].copy()
+        self.values[:len(kept)] = kept
+        self.prefix[1:len(kept) + 1] = np.cumsum(kept)
+        self.squares[1:len(kept) + 1] = np.cumsum(kept**2)
+        self.end = len(kept)
+
+    def update(self, value):
+        """
+        Consumes a single sample
+        :param value:
+        :return:
+            word of the window ending with the sample, None while the first window is incomplete or if the word was
+            suppressed by numerosity reduction
+        """
+        if self.end == len(self.values):
+            self._rebase()
+        self.values[self.end] = value
+        self.prefix[self.end + 1] = self.prefix[self.end] + value
+        self.squares[self.end + 1] = self.squares[self.end] + value*value
+        self.end += 1
+        self.count += 1
+        if self.count < self.n:
+            return None
+        word = self.word()
+        if self.numerosity_reduction:
+            if self.last is not None and (word == self.last).all():
+                return None
+            self.last = word
+        return word
+
+    def word(self):
+        """
+        Encodes current window
+        :return:
+        """
+        start = self.end - self.n
+        total = self.prefix[self.end] - self.prefix[start]
+        mean = total / self.n
+        std = np.sqrt(max((self.squares[self.end] - self.squares[start]) / self.n - mean*mean, 0))
+        if std < self.eps:
+            aggregate = np.zeros(self.w)
+        else:
+            integral = self.w * self.prefix[start + self.idx] + self.rem * self.values[start + self.clipped]
+            aggregate = (np.diff(integral) / self.n - mean) / std
+        return np.searchsorted(self.breakpoints, aggregate, side='left').astype(self.dtype)
+
+
+def stream_sax(samples, n, w, c=256, numerosity_reduction=False):
+    """
+    Encodes every sliding window of a stream of samples into SAX
+    :param samples: iterable or generator of samples
+    :param n: window length
+    :param w: word length
+    :param c: cardinality
+    :param numerosity_reduction: skip words equal to the previously emitted one
+    :return:
+        generator of (window start, word) pairs, words are integer encoded as in matutil.sax_batch
+    """
+    encoder = SaxStream(n, w, c, numerosity_reduction)
+    for i, value in enumerate(samples):
+        word = encoder.update(value)
+        if word is not None:
+            yield i - n + 1, word
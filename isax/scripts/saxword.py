@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+    Copyright 2016 Denys Sobchyshak
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+import numpy as np
+
+import matutil as mt
+
+__author__ = "Denys Sobchyshak"
+__email__ = "denys.sobchyshak@gmail.com"
+
+
+class SaxWords:
+    """
+    Compact storage of SAX words of equal length. Symbols are kept as indexes in the smallest unsigned integer type
+    for the cardinality, or bit-packed when the cardinality is a power of two. String symbols are only produced for
+    display.
+    """
+    def __init__(self, codes, c):
+        """
+        :param codes: word (w) or matrix of words (m x w) of symbol indexes, e.g. as returned by matutil.sax_batch
+        :param c: cardinality
+        """
+        codes = np.atleast_2d(codes)
+        self.c = c
+        self.m, self.w = codes.shape
+        self.bits = None
+        self.data = codes.astype(mt.symbol_dtype(c), copy=False)
+
+    @classmethod
+    def encode(cls, matrix, w, c=256):
+        """
+        Encodes a normalized series or every row of a matrix of series
+        :param matrix:
+        :param w: word length
+        :param c: cardinality
+        :return:
+        """
+        return cls(mt.sax_batch(matrix, w, c), c)
+
+    def __len__(self):
+        return self.m
+
+    def __getitem__(self, idx):
+        return SaxWords(self.codes[idx], self.c)
+
+    @property
+    def codes(self):
+        """
+        Matrix of symbol indexes (m x w)
+        :return:
+        """
+        if self.bits is None:
+            return self.data
+        bits = np.unpackbits(self.data, axis=1, count=self.w * self.bits).reshape(self.m, self.w, self.bits)
+        weights = (1 << np.arange(self.bits - 1, -1, -1)).astype(mt.symbol_dtype(self.c))
+        return (bits * weights).sum(axis=2, dtype=mt.symbol_dtype(self.c))
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def pack(self):
+        """
+        Packs words into log2(c) bits per symbol, only possible for power of two cardinalities
+        :return:
+            self, packed if cardinality allows it
+        """
+        bits = self.c.bit_length() - 1
+        if self.bits is None and self.c > 1 and self.c == 1 << bits:
+            codes = self.data[:, :, np.newaxis] >> np.arange(bits - 1, -1, -1).astype(self.data.dtype)
+            self.data = np.packbits((codes & 1).astype(np.uint8).reshape(self.m, self.w * bits), axis=1)
+            self.bits = bits
+        return self
+
+    def frequencies(self):
+        """
+        Counts occurrences of every symbol over all words
+        :return:
+            array of c counts
+        """
+        return np.bincount(self.codes.ravel(), minlength=self.c)
+
+    def alphabet(self, representation='binary'):
+        """
+        String symbols of the cardinality, letters are replaced by binary symbols for more than 26 symbols as in
+        matutil.sax
+        :param representation: binary, letter, integer
+        :return:
+        """
+        if representation == 'letter' and self.c > 26:
+            representation = 'binary'
+        return mt.generate_symbols(self.c, representation)
+
+    def symbols(self, representation='binary'):
+        """
+        Renders words as lists of string symbols
+        :param representation: binary, letter, integer
+        :return:
+        """
+        alphabet = self.alphabet(representation)
+        return [[alphabet[i] for i in word] for word in self.codes.tolist()]